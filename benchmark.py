@@ -0,0 +1,284 @@
+"""Load generator and benchmark for the sensor -> agent -> logger/alert pipeline.
+
+Builds a SecuritySystem with N synthetic motion sensors, fires
+simulate_motion_detection at a target rate and reports sustained
+throughput, detection-to-commit and detection-to-alert latency, database
+growth and thread/memory usage. Several logger/dispatch configurations can
+be run back to back for comparison. Each one runs in a fresh process, so
+its peak memory and metrics aren't inherited from the configs before it:
+
+    python benchmark.py --sensors 200 --rate 2000 --duration 10 \
+        --configs sync,write-behind,write-behind+dispatch
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+
+from home_security import SecuritySystem, MotionSensor
+
+# Named SecuritySystem configurations that can be compared side by side
+CONFIGS = {
+    "sync": {},
+    "write-behind": {"write_behind": True},
+    "dispatch": {"dispatch_workers": 4},
+    "write-behind+dispatch": {"write_behind": True, "dispatch_workers": 4},
+    "write-behind+dispatch-drop": {
+        "write_behind": True, "dispatch_workers": 4, "overflow_policy": "drop_oldest",
+    },
+}
+
+
+class BenchSensor(MotionSensor):
+    """MotionSensor with a configurable monitoring interval"""
+    def __init__(self, name, location, detection_probability, interval):
+        super().__init__(name, location, detection_probability)
+        self.interval = interval
+
+    def next_interval(self):
+        return random.uniform(*self.interval)
+
+
+class LatencyProbe:
+    """Wraps the agent, logger and alert callback of a system to time each event.
+
+    Latency is measured from the SensorEvent timestamp (epoch seconds, set
+    at detection) with time.time(). Commits are matched to detections in
+    FIFO order: rows reach the database in the order log_event is called,
+    and log_event calls are serialized here so the two orders agree.
+    """
+    def __init__(self, system):
+        self.local = threading.local()
+        self.lock = threading.RLock()
+        self.pending = []
+        self.pending_head = 0
+        self.commit_latencies = []
+        self.alert_latencies = []
+        self.committed = 0
+
+        agent_update = system.agent.update
+        log_event = system.event_logger.log_event
+
+        def timed_update(event_data):
+            self.local.detected_at = event_data.timestamp
+            try:
+                agent_update(event_data)
+            finally:
+                self.local.detected_at = None
+
+        def timed_log_event(*args, **kwargs):
+            with self.lock:
+                self.pending.append(getattr(self.local, "detected_at", None))
+                return log_event(*args, **kwargs)
+
+        system.agent.update = timed_update
+        system.event_logger.log_event = timed_log_event
+        system.event_logger.set_commit_callback(self.on_commit)
+        system.set_alert_callback(self.on_alert)
+
+    def on_commit(self, rows):
+        now = time.time()
+        with self.lock:
+            start = self.pending_head
+            self.pending_head += len(rows)
+            detected = self.pending[start:self.pending_head]
+            self.committed += len(rows)
+        self.commit_latencies.extend(now - t for t in detected if t is not None)
+
+    def on_alert(self, message, timestamp):
+        detected_at = getattr(self.local, "detected_at", None)
+        if detected_at is not None:
+            self.alert_latencies.append(time.time() - detected_at)
+
+
+class ResourceSampler:
+    """Samples the live thread count in the background"""
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def db_size(db_path):
+    return sum(
+        os.path.getsize(path)
+        for path in (db_path, db_path + "-wal")
+        if os.path.exists(path)
+    )
+
+
+def drive(sensors, rate, duration, seed):
+    """Fire simulate_motion_detection at rate events/sec for duration seconds"""
+    rng = random.Random(seed)
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    deadline = started + duration
+    next_at = started
+    sent = 0
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        # Only sleep when more than a millisecond ahead; sleep() is too coarse below that
+        if next_at - now > 0.001:
+            time.sleep(next_at - now)
+        rng.choice(sensors).simulate_motion_detection()
+        sent += 1
+        next_at += interval
+    return sent
+
+
+def run_benchmark(config_name, sensors=100, rate=1000, duration=5.0, seed=1,
+                  drivers=1, detection_probability=0.0, interval=(3, 10), armed=True):
+    """Run one configuration and return a dict of results.
+
+    max_rss_mb is the peak of the whole process, so call this in a fresh
+    process (as main() does) to compare configurations.
+    """
+    options = CONFIGS[config_name]
+    workdir = tempfile.mkdtemp(prefix="hs-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    random.seed(seed)
+    try:
+        system = SecuritySystem(f"bench-{config_name}", db_path=db_path, **options)
+        # Keep formatting and printing a line per event out of the measurement
+        system.event_logger.echo = False
+        bench_sensors = [
+            BenchSensor(f"Sensor {i}", f"Zone {i % 16}", detection_probability, interval)
+            for i in range(sensors)
+        ]
+        for sensor in bench_sensors:
+            system.add_sensor(sensor)
+        if armed:
+            system.arm_system()
+        system.event_logger.flush()
+        size_before = db_size(db_path)
+
+        probe = LatencyProbe(system)
+        with ResourceSampler() as sampler:
+            system.start()
+            started = time.perf_counter()
+            sent_counts = []
+            threads = [
+                threading.Thread(
+                    target=lambda i=i: sent_counts.append(
+                        drive(bench_sensors, rate / drivers, duration, seed + i)
+                    )
+                )
+                for i in range(drivers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            driven = time.perf_counter()
+            # Drain the dispatcher and the write-behind queue
+            system.stop()
+            drained = time.perf_counter()
+        dispatch_stats = system.get_dispatch_stats()
+
+        sent = sum(sent_counts)
+        commit = sorted(probe.commit_latencies)
+        alert = sorted(probe.alert_latencies)
+        size_after = db_size(db_path)
+        dropped = (dispatch_stats["dropped_oldest"] + dispatch_stats["dropped_newest"]) if dispatch_stats else 0
+        result = {
+            "config": config_name,
+            "sensors": sensors,
+            "target_rate": rate,
+            "sent": sent,
+            "offered_rate": sent / (driven - started),
+            "committed_rows": probe.committed,
+            # Events fully processed (logged, alerted) per second, including the drain
+            "throughput": (sent - dropped) / (drained - started),
+            "drain_s": drained - driven,
+            "db_growth_bytes": size_after - size_before,
+            "bytes_per_row": (size_after - size_before) / max(1, probe.committed),
+            "peak_threads": sampler.peak_threads,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "dropped": dropped,
+        }
+        for label, values in (("commit", commit), ("alert", alert)):
+            for name, fraction in (("p50", 0.50), ("p99", 0.99), ("p999", 0.999)):
+                result[f"{label}_{name}_ms"] = percentile(values, fraction) * 1000
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_table(results):
+    columns = [
+        ("config", "{}"), ("sent", "{}"), ("throughput", "{:.0f}/s"),
+        ("commit_p50_ms", "{:.2f}"), ("commit_p99_ms", "{:.2f}"), ("commit_p999_ms", "{:.2f}"),
+        ("alert_p50_ms", "{:.2f}"), ("alert_p99_ms", "{:.2f}"), ("alert_p999_ms", "{:.2f}"),
+        ("bytes_per_row", "{:.0f}"), ("peak_threads", "{}"), ("max_rss_mb", "{:.0f}"), ("dropped", "{}"),
+    ]
+    rows = [[fmt.format(result[key]) for key, fmt in columns] for result in results]
+    widths = [max(len(key), *(len(row[i]) for row in rows)) for i, (key, _) in enumerate(columns)]
+    print("  ".join(key.ljust(width) for (key, _), width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sensor-to-alert pipeline")
+    parser.add_argument("--sensors", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1000, help="target events/sec from the load driver")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per configuration")
+    parser.add_argument("--drivers", type=int, default=1, help="load driver threads")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--detection-probability", type=float, default=0.0,
+                        help="background detection probability of each sensor's own monitoring")
+    parser.add_argument("--disarmed", action="store_true", help="leave the system disarmed (no alerts)")
+    parser.add_argument("--configs", default="sync,write-behind",
+                        help="comma separated list from: " + ", ".join(CONFIGS))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    names = args.configs.split(",")
+    for name in names:
+        if name not in CONFIGS:
+            parser.error(f"unknown config {name!r}")
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        # One process per config: ru_maxrss only ever grows within a process
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_benchmark, (name,), dict(
+                sensors=args.sensors, rate=args.rate, duration=args.duration,
+                seed=args.seed, drivers=args.drivers,
+                detection_probability=args.detection_probability, armed=not args.disarmed,
+            )))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
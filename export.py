@@ -0,0 +1,142 @@
+"""Export event history to CSV, JSONL or Parquet.
+
+Events are read oldest first in chunks and written as they arrive, so
+exports of any size run in constant memory. Parquet needs pyarrow
+(pip install pyarrow); each chunk becomes one row group.
+
+    python export.py alerts.csv --type ALERT --start 2024-05-01 --end 2024-06-01
+    python export.py - --format jsonl --location Garage | gzip > garage.jsonl.gz
+    python export.py history.parquet --db security_system.db
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import sys
+
+from home_security import EventLogger, setup_database, load_config, DB_PATH
+
+FIELDS = ("id", "timestamp", "ts", "event_type", "sensor", "location", "count", "description", "first_seen", "last_seen")
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def _records(events):
+    # iter_events() tuples -> dicts in FIELDS order
+    for event_id, ts, timestamp, event_type, sensor, location, count, description, first_seen, last_seen in events:
+        yield {
+            "id": event_id, "timestamp": timestamp, "ts": ts, "event_type": event_type,
+            "sensor": sensor, "location": location, "count": count, "description": description,
+            "first_seen": first_seen, "last_seen": last_seen,
+        }
+
+
+def write_csv(events, f):
+    writer = csv.writer(f)
+    writer.writerow(FIELDS)
+    written = 0
+    for event_id, ts, timestamp, event_type, sensor, location, count, description, first_seen, last_seen in events:
+        writer.writerow((event_id, timestamp, ts, event_type, sensor, location, count, description, first_seen, last_seen))
+        written += 1
+    return written
+
+
+def write_jsonl(events, f):
+    written = 0
+    for record in _records(events):
+        f.write(json.dumps(record) + "\n")
+        written += 1
+    return written
+
+
+def write_parquet(events, path, chunk_size=5000):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    schema = pa.schema([
+        ("id", pa.int64()), ("timestamp", pa.string()), ("ts", pa.int64()), ("event_type", pa.string()),
+        ("sensor", pa.string()), ("location", pa.string()), ("count", pa.int64()), ("description", pa.string()),
+        ("first_seen", pa.int64()), ("last_seen", pa.int64()),
+    ])
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        columns = {field: [] for field in FIELDS}
+        for record in _records(events):
+            for field in FIELDS:
+                columns[field].append(record[field])
+            written += 1
+            if written % chunk_size == 0:
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                columns = {field: [] for field in FIELDS}
+        if columns["id"] or not written:
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+    return written
+
+
+def export_events(events, path, export_format, chunk_size=5000):
+    """Write events (from iter_events) to path ("-" for stdout); returns how many"""
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}")
+    if export_format == "parquet":
+        if path == "-":
+            raise ValueError("Parquet can't be written to stdout")
+        return write_parquet(events, path, chunk_size)
+    write = write_csv if export_format == "csv" else write_jsonl
+    if path == "-":
+        return write(events, sys.stdout)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        return write(events, f)
+
+
+def guess_format(path):
+    lower = path.lower()
+    if lower.endswith(".parquet"):
+        return "parquet"
+    if lower.endswith((".jsonl", ".json", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def parse_time(value):
+    """Epoch seconds or an ISO date/time"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export recorded security events")
+    parser.add_argument("output", help='file to write, or "-" for stdout')
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the file extension)")
+    parser.add_argument("--config", help="JSON config file naming the database")
+    parser.add_argument("--db", help="database to read (default: from the config)")
+    parser.add_argument("--start", help="first time to include (epoch seconds or ISO)")
+    parser.add_argument("--end", help="time to stop before (epoch seconds or ISO)")
+    parser.add_argument("--type", dest="event_type", help="only this event type, e.g. ALERT")
+    parser.add_argument("--location", help="only this location")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows read per query")
+    args = parser.parse_args(argv)
+    try:
+        start = parse_time(args.start) if args.start else None
+        end = parse_time(args.end) if args.end else None
+    except ValueError as e:
+        parser.error(f"invalid time: {e}")
+
+    db_path = args.db or (load_config(args.config).get("db_path", DB_PATH) if args.config else DB_PATH)
+    # Keep setup messages out of an export written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        setup_database(db_path)
+    logger = EventLogger(db_path)
+    events = logger.iter_events(start, end, args.event_type, args.location, args.chunk_size)
+    try:
+        exported = export_events(events, args.output, args.format or guess_format(args.output), args.chunk_size)
+    except (RuntimeError, ValueError) as e:
+        parser.error(str(e))
+    print(f"Exported {exported:,} events", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
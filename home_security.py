@@ -1,21 +1,24 @@
 import random
 import time
+# Taken as early as possible so headless startup can report import cost
+_IMPORT_STARTED = time.perf_counter()
 import sqlite3
 import datetime
 import threading
-from abc import ABC, abstractmethod
-import customtkinter as ctk
-from PIL import Image, ImageTk
+import re
+import queue
+import collections
+import json
 import os
+import signal
+import bisect
+from abc import ABC, abstractmethod
 
-# Set appearance mode and default color theme
-ctk.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
-ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
+DB_PATH = 'security_system.db'
 
-# Database setup
-def setup_database():
-    conn = sqlite3.connect('security_system.db')
-    cursor = conn.cursor()
+# Schema migrations. PRAGMA user_version records how many have been applied,
+# so existing security_system.db files are upgraded in place.
+def _migrate_create_events(cursor):
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS events (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,44 +27,1730 @@ def setup_database():
         description TEXT
     )
     ''')
-    conn.commit()
+
+_MOTION_DESCRIPTION = re.compile(r"Motion detected at (?P<location>.+) by (?P<sensor>.+)$")
+_SENSOR_ADDED_DESCRIPTION = re.compile(r"^Added (?P<sensor>.+) sensor at (?P<location>.+)$")
+
+def _add_column(cursor, table, column, declaration):
+    """ALTER TABLE ... ADD COLUMN unless an earlier, interrupted run already added it"""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def _migrate_add_epoch_and_indexes(cursor):
+    # Integer epoch timestamps plus the sensor/location columns we filter on.
+    # Older versions committed these before bumping the schema version.
+    _add_column(cursor, "events", "ts", "INTEGER")
+    _add_column(cursor, "events", "sensor", "TEXT")
+    _add_column(cursor, "events", "location", "TEXT")
+    # Old rows stored local time as text
+    cursor.execute("UPDATE events SET ts = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)")
+    
+    # Recover sensor and location from the descriptions of old rows
+    cursor.execute("SELECT id, description FROM events")
+    updates = []
+    for event_id, description in cursor.fetchall():
+        match = (_MOTION_DESCRIPTION.search(description or "")
+                 or _SENSOR_ADDED_DESCRIPTION.search(description or ""))
+        if match:
+            updates.append((match.group("sensor"), match.group("location"), event_id))
+    cursor.executemany("UPDATE events SET sensor = ?, location = ? WHERE id = ?", updates)
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (event_type, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_location_ts ON events (location, ts)")
+
+def _migrate_add_event_count(cursor):
+    # Coalesced rows stand for several detections
+    cursor.execute("ALTER TABLE events ADD COLUMN event_count INTEGER NOT NULL DEFAULT 1")
+
+# Built-in event types and their small-int codes in the events table
+EVENT_TYPE_CODES = {"SYSTEM": 0, "MOTION": 1, "ALERT": 2}
+
+def _check_event_type(event_type):
+    if not isinstance(event_type, str) or not event_type:
+        raise ValueError(f"Event type must be a non-empty string, not {event_type!r}")
+
+def _default_description(event_type, sensor, location):
+    """Text of the standard sensor events, rebuilt on read instead of stored per row"""
+    if sensor is None or location is None:
+        return None
+    if event_type == "MOTION":
+        return f"Motion detected at {location} by {sensor}"
+    if event_type == "ALERT":
+        return f"Alert triggered: Motion detected at {location} by {sensor}"
+    if event_type == "SYSTEM":
+        return f"Added {sensor} sensor at {location}"
+    return None
+
+def _event_description(event_type, sensor, location, detail):
+    """Description of a stored event: its detail text or the standard text"""
+    if detail is not None:
+        return detail
+    return _default_description(event_type, sensor, location)
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query that matches every word; a trailing * matches a prefix"""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def _migrate_normalize_events(cursor):
+    # Integer-coded rows that reference lookup tables instead of repeating text.
+    # The description is only kept (as detail) when it can't be rebuilt.
+    # Older versions could be stopped after creating the lookup tables, so
+    # those may already exist, along with a half-copied events_compact.
+    cursor.execute("CREATE TABLE IF NOT EXISTS event_types (code INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS sensors (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS locations (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    cursor.execute("DROP TABLE IF EXISTS events_compact")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO event_types (code, name) VALUES (?, ?)",
+        [(code, name) for name, code in EVENT_TYPE_CODES.items()]
+    )
+    cursor.execute("INSERT OR IGNORE INTO event_types (name) SELECT DISTINCT event_type FROM events WHERE event_type IS NOT NULL")
+    cursor.execute("INSERT OR IGNORE INTO sensors (name) SELECT DISTINCT sensor FROM events WHERE sensor IS NOT NULL")
+    cursor.execute("INSERT OR IGNORE INTO locations (name) SELECT DISTINCT location FROM events WHERE location IS NOT NULL")
+    cursor.execute('''
+    CREATE TABLE events_compact (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        type_code INTEGER NOT NULL,
+        sensor_id INTEGER,
+        location_id INTEGER,
+        event_count INTEGER NOT NULL DEFAULT 1,
+        detail TEXT
+    )
+    ''')
+    
+    old_rows = cursor.connection.execute('''
+    SELECT e.id, COALESCE(e.ts, 0), t.code, s.id, l.id, e.event_count,
+           e.event_type, e.sensor, e.location, e.description
+    FROM events e
+    JOIN event_types t ON t.name = COALESCE(e.event_type, 'SYSTEM')
+    LEFT JOIN sensors s ON s.name = e.sensor
+    LEFT JOIN locations l ON l.name = e.location
+    ORDER BY e.id
+    ''')
+    while True:
+        chunk = old_rows.fetchmany(5000)
+        if not chunk:
+            break
+        compact = []
+        for event_id, ts, code, sensor_id, location_id, count, event_type, sensor, location, description in chunk:
+            detail = description
+            if count == 1 and description == _default_description(event_type, sensor, location):
+                detail = None
+            compact.append((event_id, ts, code, sensor_id, location_id, count, detail))
+        cursor.executemany(
+            "INSERT INTO events_compact (id, ts, type_code, sensor_id, location_id, event_count, detail) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            compact
+        )
+    
+    cursor.execute("DROP TABLE events")
+    cursor.execute("ALTER TABLE events_compact RENAME TO events")
+    cursor.execute("CREATE INDEX idx_events_ts ON events (ts)")
+    cursor.execute("CREATE INDEX idx_events_type_ts ON events (type_code, ts)")
+    cursor.execute("CREATE INDEX idx_events_location_ts ON events (location_id, ts)")
+    # The old table's pages are free now; reclaim them
+    return True
+
+def _migrate_add_rollups(cursor):
+    # Per-hour/location/type counters kept up to date on insert, so long-range
+    # statistics survive pruning and never scan raw rows. location_id 0 means
+    # "no location".
+    cursor.execute('''
+    CREATE TABLE event_rollups (
+        hour INTEGER NOT NULL,
+        location_id INTEGER NOT NULL,
+        type_code INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (hour, location_id, type_code)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    INSERT INTO event_rollups (hour, location_id, type_code, count)
+    SELECT ts / 3600 * 3600, COALESCE(location_id, 0), type_code, SUM(event_count)
+    FROM events GROUP BY 1, 2, 3
+    ''')
+    # Pruned pages are given back with PRAGMA incremental_vacuum; switching
+    # modes only takes effect after the VACUUM setup_database runs next
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    return True
+
+def _migrate_add_search_index(cursor):
+    # Contentless full-text index of event descriptions keyed by event id.
+    # Standard descriptions aren't stored, so the text is rebuilt here and by
+    # the logger on insert; deleting an entry needs the same text again.
+    cursor.execute("CREATE VIRTUAL TABLE events_fts USING fts5(description, content='')")
+    rows = cursor.connection.execute('''
+    SELECT e.id, t.name, s.name, l.name, e.detail FROM events e
+    JOIN event_types t ON t.code = e.type_code
+    LEFT JOIN sensors s ON s.id = e.sensor_id
+    LEFT JOIN locations l ON l.id = e.location_id
+    ''')
+    while True:
+        chunk = rows.fetchmany(5000)
+        if not chunk:
+            break
+        cursor.executemany(
+            "INSERT INTO events_fts (rowid, description) VALUES (?, ?)",
+            [(event_id, _event_description(event_type, sensor, location, detail))
+             for event_id, event_type, sensor, location, detail in chunk]
+        )
+
+def _migrate_add_notification_outbox(cursor):
+    # Alerts waiting to be delivered by a notifier (home_security_notify).
+    # Rows are deleted once delivered; dead rows gave up after max attempts.
+    cursor.execute('''
+    CREATE TABLE notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        last_error TEXT,
+        dead INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute("CREATE INDEX idx_outbox_pending ON notification_outbox (dead, next_attempt)")
+
+def _migrate_add_activity_heatmap(cursor):
+    # Counters per location, type and hour of the week (local time, Monday
+    # 00:00 = 0), kept up to date on insert like the rollups. Backfilled from
+    # the rollups, so history that was already pruned is included.
+    cursor.execute('''
+    CREATE TABLE activity_heatmap (
+        location_id INTEGER NOT NULL,
+        type_code INTEGER NOT NULL,
+        hour_of_week INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (location_id, type_code, hour_of_week)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    INSERT INTO activity_heatmap (location_id, type_code, hour_of_week, count)
+    SELECT location_id, type_code,
+           (CAST(strftime('%w', hour, 'unixepoch', 'localtime') AS INTEGER) + 6) % 7 * 24
+           + CAST(strftime('%H', hour, 'unixepoch', 'localtime') AS INTEGER),
+           SUM(count)
+    FROM event_rollups GROUP BY 1, 2, 3
+    ''')
+
+def _migrate_rebuild_search_index(cursor):
+    # Before schema v9 the logger indexed the description as passed in, so
+    # rows logged without one were indexed with no text while pruning
+    # deleted them by their standard text, which corrupts a contentless
+    # index. Rebuild it from the text every row reads back as.
+    cursor.execute("DROP TABLE events_fts")
+    _migrate_add_search_index(cursor)
+
+def _migrate_add_burst_times(cursor):
+    # Summary rows of a folded burst record when it started and ended
+    # (epoch seconds); NULL on every other row. Older summary rows only
+    # have the times in their description text.
+    cursor.execute("ALTER TABLE events ADD COLUMN first_seen INTEGER")
+    cursor.execute("ALTER TABLE events ADD COLUMN last_seen INTEGER")
+
+SCHEMA_MIGRATIONS = [
+    _migrate_create_events,
+    _migrate_add_epoch_and_indexes,
+    _migrate_add_event_count,
+    _migrate_normalize_events,
+    _migrate_add_rollups,
+    _migrate_add_search_index,
+    _migrate_add_notification_outbox,
+    _migrate_add_activity_heatmap,
+    _migrate_rebuild_search_index,
+    _migrate_add_burst_times,
+]
+
+# Databases this process has already set up (absolute paths)
+_READY_DATABASES = set()
+
+# Database setup
+def setup_database(db_path=DB_PATH):
+    # Each SecuritySystem calls this; only the first call per file does any work
+    key = os.path.abspath(db_path)
+    if key in _READY_DATABASES and os.path.exists(key):
+        return
+    # sqlite3 would commit CREATE/ALTER as they run; with isolation_level=None
+    # each migration and its version bump share one explicit transaction, so
+    # a migration that is stopped partway leaves the database as it was
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    vacuum = False
+    for number, migration in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        cursor.execute("BEGIN")
+        try:
+            # A migration returns True when it rewrote tables and left free pages behind
+            vacuum = migration(cursor) or vacuum
+            cursor.execute(f"PRAGMA user_version = {number}")
+            cursor.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            conn.close()
+            raise
+        if version:
+            print(f"Database migrated to schema version {number}.")
+    if vacuum:
+        conn.execute("VACUUM")
     conn.close()
+    if db_path != ":memory:":
+        _READY_DATABASES.add(key)
     print("Database initialized.")
 
+def _to_epoch(value):
+    """Accept epoch seconds or a datetime and return epoch seconds"""
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    return int(value)
+
+# Metrics
+class LatencyHistogram:
+    """HDR-style latency histogram with bounded relative error.
+
+    Values are recorded in microseconds into log2 buckets that are each
+    split into linear sub-buckets, so percentiles are accurate to about 3%
+    across the whole range. Every thread records into its own shard, so
+    record() takes no lock; readers merge the shards.
+    """
+    SUB_BUCKET_BITS = 5
+    
+    def __init__(self):
+        self._sub_buckets = 1 << self.SUB_BUCKET_BITS
+        self._half = self._sub_buckets >> 1
+        self._size = 64 * self._half
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+    
+    def _new_shard(self):
+        # [bucket counts, count, total, max]
+        shard = [[0] * self._size, 0, 0.0, 0.0]
+        self._local.shard = shard
+        with self._shards_lock:
+            self._shards.append(shard)
+        return shard
+    
+    def record(self, seconds):
+        micros = int(seconds * 1000000)
+        if micros < self._sub_buckets:
+            index = max(micros, 0)
+        else:
+            shift = micros.bit_length() - self.SUB_BUCKET_BITS
+            index = shift * self._half + (micros >> shift)
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[0][index] += 1
+        shard[1] += 1
+        shard[2] += seconds
+        if seconds > shard[3]:
+            shard[3] = seconds
+    
+    @property
+    def count(self):
+        return sum(shard[1] for shard in self._shards)
+    
+    @property
+    def total(self):
+        return sum(shard[2] for shard in self._shards)
+    
+    @property
+    def max(self):
+        return max((shard[3] for shard in self._shards), default=0.0)
+    
+    def _bucket_value(self, index):
+        # Midpoint of the bucket, in seconds
+        if index < self._sub_buckets:
+            return index / 1000000
+        shift = index // self._half - 1
+        top = index - shift * self._half
+        low = top << shift
+        high = ((top + 1) << shift) - 1
+        return (low + high) / 2 / 1000000
+    
+    def _merged_counts(self):
+        counts = [0] * self._size
+        for shard in list(self._shards):
+            for index, bucket in enumerate(shard[0]):
+                if bucket:
+                    counts[index] += bucket
+        return counts
+    
+    def percentiles(self, fractions):
+        counts = self._merged_counts()
+        count = sum(counts)
+        results = []
+        for fraction in fractions:
+            if not count:
+                results.append(0.0)
+                continue
+            rank = max(1, int(fraction * count + 0.5))
+            seen = 0
+            for index, bucket in enumerate(counts):
+                seen += bucket
+                if seen >= rank:
+                    results.append(self._bucket_value(index))
+                    break
+        return results
+    
+    def percentile(self, fraction):
+        return self.percentiles([fraction])[0]
+    
+    def snapshot(self):
+        p50, p90, p99, p999 = self.percentiles([0.50, 0.90, 0.99, 0.999])
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+            "p999": p999,
+        }
+    
+    def reset(self):
+        # Threads start fresh shards on their next record()
+        with self._shards_lock:
+            self._local = threading.local()
+            self._shards = []
+
+class MetricsRegistry:
+    """In-process counters, latency histograms and gauges.
+
+    Stages record with METRICS.observe(name, seconds) and METRICS.inc(name);
+    gauges are callables sampled at read time (queue depths and the like).
+    Counters are kept per thread like the histograms, so the hot path never
+    takes a lock. snapshot() returns plain dicts and render_prometheus() the
+    text format served by start_metrics_server().
+    """
+    QUANTILES = (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99"), ("0.999", "p999"))
+    
+    def __init__(self, prefix="home_security"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counter_shards = []
+        self._histograms = {}
+        self._gauges = {}
+    
+    def _new_counter_shard(self):
+        counters = {}
+        self._local.counters = counters
+        with self._lock:
+            self._counter_shards.append(counters)
+        return counters
+    
+    def inc(self, name, amount=1):
+        try:
+            counters = self._local.counters
+        except AttributeError:
+            counters = self._new_counter_shard()
+        counters[name] = counters.get(name, 0) + amount
+    
+    def counters(self):
+        with self._lock:
+            shards = list(self._counter_shards)
+        totals = {}
+        for shard in shards:
+            for name, value in dict(shard).items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+    
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+    
+    def register_histogram(self, name, histogram):
+        with self._lock:
+            self._histograms[name] = histogram
+    
+    def observe(self, name, seconds):
+        self.histogram(name).record(seconds)
+    
+    def register_gauge(self, name, func):
+        with self._lock:
+            self._gauges[name] = func
+    
+    def snapshot(self):
+        counters = self.counters()
+        with self._lock:
+            histograms = dict(self._histograms)
+            gauges = dict(self._gauges)
+        gauge_values = {}
+        for name, func in gauges.items():
+            try:
+                gauge_values[name] = func()
+            except Exception:
+                gauge_values[name] = None
+        return {
+            "counters": counters,
+            "gauges": gauge_values,
+            "latency_seconds": {name: histogram.snapshot() for name, histogram in histograms.items()},
+        }
+    
+    def render_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is None:
+                continue
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        for name, stats in sorted(snapshot["latency_seconds"].items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for quantile, key in self.QUANTILES:
+                lines.append(f'{metric}{{quantile="{quantile}"}} {stats[key]:.6f}')
+            lines.append(f"{metric}_sum {stats['sum']:.6f}")
+            lines.append(f"{metric}_count {stats['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._local = threading.local()
+            self._counter_shards = []
+            histograms = list(self._histograms.values())
+        for histogram in histograms:
+            histogram.reset()
+
+# Process-wide registry used by all stages
+METRICS = MetricsRegistry()
+
+def start_metrics_server(port=9464, host="127.0.0.1", registry=METRICS):
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread"""
+    # Only imported when the endpoint is requested
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = registry.render_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = json.dumps(registry.snapshot()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="MetricsServer")
+    thread.daemon = True
+    thread.start()
+    print(f"Metrics available at http://{host}:{server.server_port}/metrics")
+    return server
+
+# Retention
+class RetentionPolicy:
+    """How much raw event history to keep.
+
+    Rows older than max_age_days and rows beyond the newest max_rows are
+    deleted, at most batch_size rows per limit per run, so a prune never
+    holds the database for long. Freed pages are returned to the file
+    system with an incremental vacuum of up to vacuum_pages pages. Rollups
+    are never pruned.
+    """
+    def __init__(self, max_age_days=None, max_rows=None, batch_size=500, interval=5.0, vacuum_pages=256):
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+
 # Event Logger
+class RecentEventCache:
+    """The newest events, kept in memory as the logger writes them.
+
+    Holds up to capacity events as SELECT_SQL rows ordered by (ts, id), the
+    order get_recent_events() uses. Every event newer than the oldest cached
+    one is in the cache, and max_outside_id is the largest id that isn't, so
+    the cache can tell when its answer is exact; otherwise a query returns
+    None and the caller reads SQLite instead. Readers only take the cache's
+    own lock, never db_lock. This assumes the process is the only writer.
+    """
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._keys = []
+        self._rows = []
+        # Nothing is answered from memory until load() has run
+        self.loaded = False
+        self._complete = False
+        self._max_outside_id = 0
+    
+    def load(self, rows, complete, max_outside_id):
+        """Start from the newest rows in the database; complete means there are no others"""
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        with self._lock:
+            self._keys = [(row[1], row[0]) for row in rows]
+            self._rows = rows
+            self._complete = complete
+            self._max_outside_id = max_outside_id
+            self.loaded = True
+    
+    def add(self, rows):
+        """Add rows just committed to the database"""
+        with self._lock:
+            keys = self._keys
+            for row in rows:
+                key = (row[1], row[0])
+                if len(keys) >= self.capacity and (not keys or key < keys[0]):
+                    # Older than everything cached, so it stays outside
+                    self._complete = False
+                    self._max_outside_id = max(self._max_outside_id, row[0])
+                    continue
+                if not keys or key > keys[-1]:
+                    keys.append(key)
+                    self._rows.append(row)
+                else:
+                    index = bisect.bisect(keys, key)
+                    keys.insert(index, key)
+                    self._rows.insert(index, row)
+            excess = len(keys) - self.capacity
+            if excess > 0:
+                self._complete = False
+                self._max_outside_id = max(self._max_outside_id, max(row[0] for row in self._rows[:excess]))
+                del keys[:excess]
+                del self._rows[:excess]
+    
+    def discard(self, ids):
+        """Forget deleted events"""
+        ids = set(ids)
+        with self._lock:
+            keep = [index for index, row in enumerate(self._rows) if row[0] not in ids]
+            if len(keep) < len(self._rows):
+                self._keys = [self._keys[index] for index in keep]
+                self._rows = [self._rows[index] for index in keep]
+    
+    def recent(self, limit, event_type=None):
+        """Newest rows first, or None when older rows outside the cache could belong"""
+        result = []
+        with self._lock:
+            if not self.loaded:
+                return None
+            for row in reversed(self._rows):
+                if event_type is None or row[2] == event_type:
+                    result.append(row)
+                    if len(result) >= limit:
+                        return result
+            complete = self._complete
+        return result if complete else None
+    
+    def since(self, last_id, limit):
+        """Rows with id > last_id, highest id first, or None if some aren't cached"""
+        with self._lock:
+            if not self.loaded or last_id < self._max_outside_id:
+                return None
+            result = [row for row in self._rows if row[0] > last_id]
+        result.sort(key=lambda row: row[0], reverse=True)
+        return result[:limit]
+
 class EventLogger:
-    def __init__(self):
+    """Writes events to SQLite.
+
+    By default every event is committed synchronously on the calling thread.
+    With write_behind=True events are queued and a background writer thread
+    commits them in batches on one long-lived WAL connection, so log_event
+    returns immediately. Call flush() to wait for queued events and close()
+    to stop the writer.
+
+    Rows are stored compactly: integer epoch seconds, a small-int event type
+    code and sensor/location ids from lookup tables. Standard descriptions
+    are rebuilt on read and only non-standard text is stored.
+
+    The newest cache_size events are also kept in a RecentEventCache, loaded
+    on startup and updated after every commit, so get_recent_events() and
+    get_events_since() normally don't touch SQLite at all.
+    """
+    INSERT_SQL = (
+        "INSERT INTO events (ts, type_code, sensor_id, location_id, event_count, detail, first_seen, last_seen) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    ROLLUP_SQL = (
+        "INSERT INTO event_rollups (hour, location_id, type_code, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (hour, location_id, type_code) DO UPDATE SET count = count + excluded.count"
+    )
+    HEATMAP_SQL = (
+        "INSERT INTO activity_heatmap (location_id, type_code, hour_of_week, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (location_id, type_code, hour_of_week) DO UPDATE SET count = count + excluded.count"
+    )
+    # Columns decoded by _decode_event
+    SELECT_SQL = (
+        "SELECT e.id, e.ts, t.name, s.name, l.name, e.event_count, e.detail FROM events e "
+        "JOIN event_types t ON t.code = e.type_code "
+        "LEFT JOIN sensors s ON s.id = e.sensor_id "
+        "LEFT JOIN locations l ON l.id = e.location_id"
+    )
+    # SELECT_SQL plus the burst times, for iter_events
+    SELECT_BURSTS_SQL = (
+        "SELECT e.id, e.ts, t.name, s.name, l.name, e.event_count, e.detail, e.first_seen, e.last_seen FROM events e "
+        "JOIN event_types t ON t.code = e.type_code "
+        "LEFT JOIN sensors s ON s.id = e.sensor_id "
+        "LEFT JOIN locations l ON l.id = e.location_id"
+    )
+
+    def __init__(self, db_path=DB_PATH, write_behind=False, batch_size=256, flush_interval=0.05, cache_size=1000):
+        self.db_path = db_path
         self.db_lock = threading.Lock()
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = None
+        self._writer_thread = None
+        self.commit_callback = None
+        # False skips the "[LOG] ..." console line per event, e.g. for simulations
+        self.echo = True
+        # name -> id caches for the lookup tables, filled as names are written
+        self._type_codes = dict(EVENT_TYPE_CODES)
+        self._lookup_ids = {"sensors": {}, "locations": {}}
+        # Local hour of the week per quarter hour (time zone offsets are whole quarters)
+        self._hours_of_week = {}
+        # Rows buffered between begin_bulk() and end_bulk()
+        self._bulk_rows = None
+        self._bulk_size = 0
+        self.recent = RecentEventCache(cache_size)
+        self.warm_cache()
+        if write_behind:
+            self._queue = queue.Queue()
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="EventLoggerWriter")
+            self._writer_thread.daemon = True
+            self._writer_thread.start()
     
-    def log_event(self, event_type, description):
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def log_event(self, event_type, description, location=None, sensor=None, count=1, when=None, first_seen=None):
+        # when (epoch seconds) stamps the row with the time the event happened,
+        # e.g. detection time or a simulated clock; defaults to now. A burst
+        # summary row also passes first_seen and is stored with both times.
+        _check_event_type(event_type)
+        started = time.perf_counter()
+        now = time.time() if when is None else when
+        timestamp = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        row = (now, event_type, description, sensor, location, count, first_seen)
+        
+        write_queue = self._queue
+        if write_queue is not None:
+            # Hand the row to the writer thread and return right away
+            write_queue.put(row)
+        else:
+            self._write_now([row])
         
+        if self.echo:
+            print(f"[LOG] {timestamp} - {event_type}: {description}")
+        METRICS.inc("events_logged")
+        METRICS.observe("log_event", time.perf_counter() - started)
+        return timestamp
+    
+    def log_events(self, events, echo=True):
+        """Log many (event_type, description, location, sensor) events in one transaction.
+
+        With write_behind they are queued like log_event() rows. echo=False
+        skips printing a line per event. Returns how many were logged.
+        """
+        events = list(events)
+        for event in events:
+            _check_event_type(event[0])
+        now = time.time()
+        rows = [(now, event_type, description, sensor, location, 1, None)
+                for event_type, description, location, sensor in events]
+        if not rows:
+            return 0
+        write_queue = self._queue
+        if write_queue is not None:
+            for row in rows:
+                write_queue.put(row)
+        else:
+            self._write_now(rows)
+        if echo and self.echo:
+            timestamp = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+            for event_type, description, _, _ in events:
+                print(f"[LOG] {timestamp} - {event_type}: {description}")
+        METRICS.inc("events_logged", len(events))
+        return len(events)
+    
+    def _write_now(self, rows):
+        """Commit rows in one transaction, or buffer them while in bulk mode"""
         # Use a lock to prevent concurrent database access
+        wait_started = time.perf_counter()
         with self.db_lock:
-            # Create a new connection and cursor for each operation
-            conn = sqlite3.connect('security_system.db')
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO events (timestamp, event_type, description) VALUES (?, ?, ?)",
-                (timestamp, event_type, description)
-            )
-            conn.commit()
+            METRICS.observe("db_lock_wait", time.perf_counter() - wait_started)
+            # Checked under the lock, so end_bulk() can't finish in between
+            bulk = self._bulk_rows is not None
+            if bulk:
+                # Bulk mode: buffer the rows and insert a whole batch at once
+                self._bulk_rows.extend(rows)
+                full = len(self._bulk_rows) >= self._bulk_size
+            else:
+                # Create a new connection and cursor for each operation
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    written = self._write_rows(conn, rows)
+                    conn.commit()
+                except Exception:
+                    self._forget_ids()
+                    raise
+                finally:
+                    conn.close()
+                self.recent.add(written)
+        if bulk:
+            if full:
+                self._write_bulk()
+            return
+        METRICS.inc("rows_committed", len(rows))
+        if self.commit_callback:
+            self.commit_callback(rows)
+    
+    def _lookup_id(self, conn, table, name):
+        if name is None:
+            return None
+        ids = self._lookup_ids[table]
+        lookup_id = ids.get(name)
+        if lookup_id is None:
+            conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            found = conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+            if found is None:
+                raise ValueError(f"Can't store {name!r} in {table}")
+            lookup_id = ids[name] = found[0]
+        return lookup_id
+    
+    def _forget_ids(self):
+        # After a rollback the cached ids of names inserted in it no longer exist
+        self._type_codes = dict(EVENT_TYPE_CODES)
+        self._lookup_ids = {"sensors": {}, "locations": {}}
+    
+    def _prefetch_ids(self, conn, table, names):
+        """Insert and look up every new name at once instead of one by one"""
+        ids = self._lookup_ids[table]
+        new_names = list({name for name in names if name is not None and name not in ids})
+        if len(new_names) < 2:
+            return
+        conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", [(name,) for name in new_names])
+        for start in range(0, len(new_names), 500):
+            chunk = new_names[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            ids.update(conn.execute(f"SELECT name, id FROM {table} WHERE name IN ({placeholders})", chunk))
+    
+    def _hour_of_week(self, ts):
+        quarter = ts // 900
+        hour_of_week = self._hours_of_week.get(quarter)
+        if hour_of_week is None:
+            if len(self._hours_of_week) > 10000:
+                self._hours_of_week.clear()
+            local = datetime.datetime.fromtimestamp(quarter * 900)
+            hour_of_week = self._hours_of_week[quarter] = local.weekday() * 24 + local.hour
+        return hour_of_week
+    
+    def _type_code(self, conn, event_type):
+        code = self._type_codes.get(event_type)
+        if code is None:
+            _check_event_type(event_type)
+            conn.execute("INSERT OR IGNORE INTO event_types (name) VALUES (?)", (event_type,))
+            found = conn.execute("SELECT code FROM event_types WHERE name = ?", (event_type,)).fetchone()
+            if found is None:
+                raise ValueError(f"Can't store event type {event_type!r}")
+            code = self._type_codes[event_type] = found[0]
+        return code
+    
+    def _write_rows(self, conn, rows):
+        """Encode in-memory rows, insert them and bump the rollups; the caller commits.
+
+        Returns the rows as SELECT_SQL would read them back, for the cache.
+        """
+        encoded = []
+        written = []
+        rollups = {}
+        heatmap = {}
+        if len(rows) > 1:
+            self._prefetch_ids(conn, "sensors", [row[3] for row in rows])
+            self._prefetch_ids(conn, "locations", [row[4] for row in rows])
+        for now, event_type, description, sensor, location, count, first_seen in rows:
+            detail = description
+            if count == 1 and description == _default_description(event_type, sensor, location):
+                detail = None
+            ts = int(now)
+            type_code = self._type_code(conn, event_type)
+            location_id = self._lookup_id(conn, "locations", location)
+            encoded.append((
+                ts,
+                type_code,
+                self._lookup_id(conn, "sensors", sensor),
+                location_id,
+                count,
+                detail,
+                int(first_seen) if first_seen is not None else None,
+                ts if first_seen is not None else None,
+            ))
+            written.append([None, ts, event_type, sensor, location, count, detail])
+            key = (ts - ts % 3600, location_id or 0, type_code)
+            rollups[key] = rollups.get(key, 0) + count
+            key = (location_id or 0, type_code, self._hour_of_week(ts))
+            heatmap[key] = heatmap.get(key, 0) + count
+        conn.executemany(self.INSERT_SQL, encoded)
+        # AUTOINCREMENT ids inside one write transaction are consecutive
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        for event_id, row in enumerate(written, last_id - len(rows) + 1):
+            row[0] = event_id
+        # Index the text the row reads back as; deleting the entry passes the same text
+        conn.executemany(
+            "INSERT INTO events_fts (rowid, description) VALUES (?, ?)",
+            [(event_id, description) for event_id, description in (
+                (row[0], _event_description(row[2], row[3], row[4], row[6])) for row in written
+            ) if description is not None]
+        )
+        conn.executemany(self.ROLLUP_SQL, [key + (count,) for key, count in rollups.items()])
+        conn.executemany(self.HEATMAP_SQL, [key + (count,) for key, count in heatmap.items()])
+        return [tuple(row) for row in written]
+    
+    def queue_depth(self):
+        """Rows waiting for the write-behind writer"""
+        write_queue = self._queue
+        return write_queue.qsize() if write_queue is not None else 0
+    
+    def set_commit_callback(self, callback):
+        """callback(rows) runs after each commit with the rows just written"""
+        self.commit_callback = callback
+    
+    def flush(self, timeout=None):
+        """Block until every event queued so far has been committed"""
+        write_queue = self._queue
+        if write_queue is None:
+            return True
+        done = threading.Event()
+        write_queue.put(done)
+        return done.wait(timeout)
+    
+    def begin_bulk(self, batch_size=5000):
+        """Buffer synchronous writes and insert them batch_size rows per transaction.
+
+        Meant for loading many events quickly, e.g. replaying a trace at full
+        speed. With write_behind the writer thread already batches, so this
+        does nothing. Call end_bulk() to write the rest.
+        """
+        if self._queue is None:
+            with self.db_lock:
+                self._bulk_size = batch_size
+                if self._bulk_rows is None:
+                    self._bulk_rows = []
+    
+    def end_bulk(self):
+        """Write any buffered rows and go back to one transaction per event"""
+        self._write_bulk(final=True)
+        self.flush()
+    
+    def _write_bulk(self, final=False):
+        wait_started = time.perf_counter()
+        with self.db_lock:
+            METRICS.observe("db_lock_wait", time.perf_counter() - wait_started)
+            rows = self._bulk_rows
+            self._bulk_rows = None if final else []
+            if not rows:
+                return
+            conn = sqlite3.connect(self.db_path)
+            try:
+                written = self._write_rows(conn, rows)
+                conn.commit()
+            except Exception:
+                self._forget_ids()
+                raise
+            finally:
+                conn.close()
+            self.recent.add(written)
+        METRICS.inc("rows_committed", len(rows))
+        if self.commit_callback:
+            self.commit_callback(rows)
+    
+    def close(self):
+        """Commit pending events and stop the background writer"""
+        if self._bulk_rows is not None:
+            self._write_bulk(final=True)
+        if self._writer_thread is None:
+            return
+        self._queue.put(None)
+        self._writer_thread.join()
+        self._writer_thread = None
+        # Anything logged after close falls back to synchronous writes
+        self._queue = None
+    
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only fsyncs on checkpoint, not on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                rows = []
+                waiters = []
+                deadline = time.monotonic() + self.flush_interval
+                # Gather a batch until it is full, the interval runs out,
+                # or someone asks for a flush/stop
+                while True:
+                    if item is None:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                        break
+                    rows.append(item)
+                    if len(rows) >= self.batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                
+                if rows:
+                    commit_started = time.perf_counter()
+                    rows = self._commit_batch(conn, rows)
+                    if rows:
+                        METRICS.observe("db_commit", time.perf_counter() - commit_started)
+                        METRICS.inc("rows_committed", len(rows))
+                        if self.commit_callback:
+                            try:
+                                self.commit_callback(rows)
+                            except Exception as e:
+                                # A broken callback mustn't stop the writer
+                                print(f"[LOG] Commit callback failed: {e!r}")
+                
+                for waiter in waiters:
+                    waiter.set()
+        finally:
             conn.close()
-        
-        print(f"[LOG] {timestamp} - {event_type}: {description}")
-        return timestamp
     
-    def get_recent_events(self, limit=20):
+    def _commit_batch(self, conn, rows):
+        """Write one batch on the writer connection; returns the rows committed.
+
+        Any error rolls the batch back. The rows are then retried one at a
+        time so a single bad row doesn't take the rest of the batch with it.
+        """
+        try:
+            written = self._write_rows(conn, rows)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self._forget_ids()
+            if len(rows) == 1:
+                METRICS.inc("rows_failed")
+                print(f"[LOG] Failed to write event {rows[0][1]!r}: {e!r}")
+                return []
+            committed = []
+            for row in rows:
+                committed += self._commit_batch(conn, [row])
+            return committed
+        self.recent.add(written)
+        return rows
+    
+    def prune(self, policy):
+        """Delete one batch of rows outside the retention policy; returns rows deleted"""
+        deleted = []
+        wait_started = time.perf_counter()
         with self.db_lock:
-            conn = sqlite3.connect('security_system.db')
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT timestamp, event_type, description FROM events ORDER BY timestamp DESC LIMIT ?",
-                (limit,)
+            METRICS.observe("db_lock_wait", time.perf_counter() - wait_started)
+            conn = sqlite3.connect(self.db_path)
+            try:
+                if policy.max_age_days is not None:
+                    cutoff = int(time.time() - policy.max_age_days * 86400)
+                    deleted += self._delete_events(
+                        conn, "SELECT id FROM events WHERE ts < ? ORDER BY ts LIMIT ?",
+                        (cutoff, policy.batch_size)
+                    )
+                if policy.max_rows is not None:
+                    # Ids only grow, so everything at or below max(id) - max_rows is
+                    # outside the newest max_rows rows (gaps only make it fewer)
+                    newest = conn.execute("SELECT MAX(id) FROM events").fetchone()[0] or 0
+                    deleted += self._delete_events(
+                        conn, "SELECT id FROM events WHERE id <= ? ORDER BY id LIMIT ?",
+                        (newest - policy.max_rows, policy.batch_size)
+                    )
+                conn.commit()
+                if deleted:
+                    # Only forget cached rows once their delete is committed
+                    self.recent.discard(deleted)
+                if deleted and policy.vacuum_pages:
+                    conn.execute(f"PRAGMA incremental_vacuum({int(policy.vacuum_pages)})").fetchall()
+            finally:
+                conn.close()
+        if deleted:
+            METRICS.inc("rows_pruned", len(deleted))
+        return len(deleted)
+    
+    def _delete_events(self, conn, id_query, params):
+        """Delete the events id_query selects, along with their search index
+        entries; returns the deleted ids"""
+        rows = conn.execute(f"{self.SELECT_SQL} WHERE e.id IN ({id_query})", params).fetchall()
+        if not rows:
+            return []
+        # A contentless FTS5 entry is removed by passing its original text back
+        conn.executemany(
+            "INSERT INTO events_fts (events_fts, rowid, description) VALUES ('delete', ?, ?)",
+            [(event[0], event[7]) for event in map(self._decode_event, rows) if event[7] is not None]
+        )
+        conn.executemany("DELETE FROM events WHERE id = ?", [(row[0],) for row in rows])
+        return [row[0] for row in rows]
+    
+    def get_rollups(self, start=None, end=None, location=None, event_type=None, group_by=None):
+        """Hourly counts from the rollup table as (hour, location, event_type, count).
+
+        With group_by ("hour", "location" or "type") the counts are summed
+        in SQL and (key, count) pairs are returned instead.
+        """
+        conditions, params = self._rollup_conditions(start, end, location, event_type)
+        if group_by is None:
+            columns, group = "r.hour, l.name, t.name, r.count", ""
+        else:
+            columns, group = {
+                "hour": ("r.hour, SUM(r.count)", " GROUP BY r.hour"),
+                "location": ("l.name, SUM(r.count)", " GROUP BY r.location_id"),
+                "type": ("t.name, SUM(r.count)", " GROUP BY r.type_code"),
+            }[group_by]
+        sql = (
+            f"SELECT {columns} FROM event_rollups r "
+            "JOIN event_types t ON t.code = r.type_code "
+            "LEFT JOIN locations l ON l.id = r.location_id"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += group + " ORDER BY 1"
+        return self._fetchall(sql, params)
+    
+    @staticmethod
+    def _rollup_conditions(start, end, location, event_type, table="r"):
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append(f"{table}.hour >= ?")
+            params.append(_to_epoch(start) // 3600 * 3600)
+        if end is not None:
+            conditions.append(f"{table}.hour < ?")
+            params.append(_to_epoch(end))
+        if location is not None:
+            conditions.append(f"{table}.location_id = (SELECT id FROM locations WHERE name = ?)")
+            params.append(location)
+        if event_type is not None:
+            conditions.append(f"{table}.type_code = (SELECT code FROM event_types WHERE name = ?)")
+            params.append(event_type)
+        return conditions, params
+    
+    def get_activity_totals(self, start=None, end=None, by="location", event_type=None):
+        """Event counts from the rollups grouped by "location", "type" or "hour" """
+        if by not in ("location", "type", "hour"):
+            raise ValueError(f"Can't group activity by {by!r}")
+        return dict(self.get_rollups(start, end, event_type=event_type, group_by=by))
+    
+    def get_heatmap(self, event_type=None, location=None):
+        """All-time counts per location and hour of the week: {location: [168 counts]}.
+
+        Index 0 is Monday 00:00-01:00 local time. Read from the
+        activity_heatmap counters, so the cost doesn't grow with history.
+        Events without a location are under None.
+        """
+        conditions, params = self._rollup_conditions(None, None, location, event_type, table="h")
+        sql = (
+            "SELECT l.name, h.hour_of_week, SUM(h.count) FROM activity_heatmap h "
+            "LEFT JOIN locations l ON l.id = h.location_id"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY h.location_id, h.hour_of_week"
+        heatmap = {}
+        for name, hour_of_week, count in self._fetchall(sql, params):
+            heatmap.setdefault(name, [0] * 168)[hour_of_week] = count
+        return heatmap
+    
+    def get_alert_rates(self, start=None, end=None):
+        """Alert counts and rates per location: {location: {"alerts", "motion", "alerts_per_day", "alert_ratio"}}.
+
+        alert_ratio is alerts per motion detection (None without motion).
+        Without start/end the heatmap counters are summed; with them the
+        hourly rollups in that range. Days run from the first to the last
+        hour with activity unless start and end are both given.
+        """
+        if start is None and end is None:
+            sql = (
+                "SELECT l.name, t.name, SUM(h.count) FROM activity_heatmap h "
+                "JOIN event_types t ON t.code = h.type_code "
+                "LEFT JOIN locations l ON l.id = h.location_id "
+                "WHERE t.name IN ('ALERT', 'MOTION') GROUP BY h.location_id, h.type_code"
             )
-            events = cursor.fetchall()
+            params = []
+        else:
+            conditions, params = self._rollup_conditions(start, end, None, None)
+            sql = (
+                "SELECT l.name, t.name, SUM(r.count) FROM event_rollups r "
+                "JOIN event_types t ON t.code = r.type_code "
+                "LEFT JOIN locations l ON l.id = r.location_id "
+                f"WHERE t.name IN ('ALERT', 'MOTION') AND {' AND '.join(conditions)} "
+                "GROUP BY r.location_id, r.type_code"
+            )
+        counts = {}
+        for name, event_type, count in self._fetchall(sql, params):
+            counts.setdefault(name, {"ALERT": 0, "MOTION": 0})[event_type] = count
+        
+        if start is not None and end is not None:
+            seconds = _to_epoch(end) - _to_epoch(start)
+        else:
+            conditions, params = self._rollup_conditions(start, end, None, None)
+            sql = "SELECT MIN(r.hour), MAX(r.hour) FROM event_rollups r"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            first, last = self._fetchall(sql, params)[0]
+            seconds = (last - first + 3600) if first is not None else 0
+        days = max(seconds / 86400, 1 / 24)
+        return {
+            name: {
+                "alerts": pair["ALERT"],
+                "motion": pair["MOTION"],
+                "alerts_per_day": pair["ALERT"] / days,
+                "alert_ratio": pair["ALERT"] / pair["MOTION"] if pair["MOTION"] else None,
+            }
+            for name, pair in counts.items()
+        }
+    
+    def iter_events(self, start=None, end=None, event_type=None, location=None, chunk_size=5000):
+        """Yield matching events oldest first, chunk_size rows per query.
+
+        Each chunk continues after the last (ts, id) returned, so memory use
+        is constant and no read transaction stays open between chunks.
+        Events are (id, ts, timestamp, event_type, sensor, location, count,
+        description, first_seen, last_seen) tuples; the last two are only
+        set on burst summary rows.
+        """
+        conditions, params = self._filter_conditions(start, end, event_type, location)
+        position = None
+        while True:
+            where = list(conditions)
+            chunk_params = list(params)
+            if position is not None:
+                where.append("(e.ts, e.id) > (?, ?)")
+                chunk_params.extend(position)
+            sql = self.SELECT_BURSTS_SQL
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY e.ts, e.id LIMIT ?"
+            rows = self._fetchall(sql, chunk_params + [chunk_size])
+            for row in rows:
+                yield self._decode_event(row[:7]) + row[7:]
+            if len(rows) < chunk_size:
+                return
+            position = (rows[-1][1], rows[-1][0])
+    
+    def _fetchall(self, sql, params=()):
+        wait_started = time.perf_counter()
+        with self.db_lock:
+            METRICS.observe("db_lock_wait", time.perf_counter() - wait_started)
+            conn = sqlite3.connect(self.db_path)
+            rows = conn.execute(sql, params).fetchall()
+            conn.close()
+        return rows
+    
+    @staticmethod
+    def _decode_event(row):
+        """SELECT_SQL row -> (id, ts, timestamp, event_type, sensor, location, count, description)"""
+        event_id, ts, event_type, sensor, location, count, detail = row
+        timestamp = datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        description = _event_description(event_type, sensor, location, detail)
+        return event_id, ts, timestamp, event_type, sensor, location, count, description
+    
+    def _fetch_events(self, where="", params=(), order="e.ts DESC, e.id DESC", limit=20):
+        sql = self.SELECT_SQL
+        if where:
+            sql += " WHERE " + where
+        sql += f" ORDER BY {order} LIMIT ?"
+        return [self._decode_event(row) for row in self._fetchall(sql, list(params) + [limit])]
+    
+    def warm_cache(self):
+        """Load the newest events into the recent-events cache"""
+        capacity = self.recent.capacity
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # One extra row tells us whether anything is left outside the cache
+            rows = conn.execute(f"{self.SELECT_SQL} ORDER BY e.ts DESC, e.id DESC LIMIT ?", (capacity + 1,)).fetchall()
+            complete = len(rows) <= capacity
+            rows = rows[:capacity]
+            max_outside_id = 0
+            if not complete:
+                cached = {row[0] for row in rows}
+                for (event_id,) in conn.execute("SELECT id FROM events ORDER BY id DESC"):
+                    if event_id not in cached:
+                        max_outside_id = event_id
+                        break
+        except sqlite3.OperationalError:
+            # No events table yet; every read goes to the database
+            return
+        finally:
             conn.close()
-        return events
+        self.recent.load(rows, complete, max_outside_id)
+    
+    def get_recent_events(self, limit=20, event_type=None):
+        rows = self.recent.recent(limit, event_type)
+        if rows is not None:
+            METRICS.inc("recent_cache_hits")
+            events = [self._decode_event(row) for row in rows]
+        else:
+            METRICS.inc("recent_cache_misses")
+            if event_type is None:
+                events = self._fetch_events(limit=limit)
+            else:
+                events = self._fetch_events("e.type_code = (SELECT code FROM event_types WHERE name = ?)",
+                                            (event_type,), limit=limit)
+        return [(timestamp, event_type, description)
+                for _, _, timestamp, event_type, _, _, _, description in events]
+    
+    def get_events_since(self, last_id, limit=20):
+        """Return up to limit events with id > last_id, newest first"""
+        rows = self.recent.since(last_id, limit)
+        if rows is not None:
+            METRICS.inc("recent_cache_hits")
+            events = [self._decode_event(row) for row in rows]
+        else:
+            METRICS.inc("recent_cache_misses")
+            events = self._fetch_events("e.id > ?", (last_id,), order="e.id DESC", limit=limit)
+        return [(event_id, timestamp, event_type, description)
+                for event_id, _, timestamp, event_type, _, _, _, description in events]
+    
+    def query_events(self, start=None, end=None, event_type=None, location=None, limit=50, cursor=None):
+        """Page through events newest first using the ts indexes.
+
+        start/end are epoch seconds or datetimes (start inclusive, end
+        exclusive). Returns (events, next_cursor) where events are
+        (id, timestamp, event_type, location, description) tuples; pass
+        next_cursor back in to fetch the following page. next_cursor is None
+        once there are no more rows. The cursor is a (ts, id) tuple.
+        """
+        conditions, params = self._filter_conditions(start, end, event_type, location)
+        if cursor is not None:
+            if not isinstance(cursor, (tuple, list)) or len(cursor) != 2:
+                raise ValueError(f"Expected a (ts, id) cursor from query_events, got {cursor!r}")
+            # Keyset pagination: continue strictly after the last row we returned
+            conditions.append("(e.ts, e.id) < (?, ?)")
+            params.extend(cursor)
+        
+        rows = self._fetch_events(" AND ".join(conditions), params, limit=limit)
+        
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = (last[1], last[0])
+        events = [(event_id, timestamp, event_type, event_location, description)
+                  for event_id, _, timestamp, event_type, _, event_location, _, description in rows]
+        return events, next_cursor
+    
+    @staticmethod
+    def _filter_conditions(start, end, event_type, location):
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append("e.ts >= ?")
+            params.append(_to_epoch(start))
+        if end is not None:
+            conditions.append("e.ts < ?")
+            params.append(_to_epoch(end))
+        if event_type is not None:
+            conditions.append("e.type_code = (SELECT code FROM event_types WHERE name = ?)")
+            params.append(event_type)
+        if location is not None:
+            conditions.append("e.location_id = (SELECT id FROM locations WHERE name = ?)")
+            params.append(location)
+        return conditions, params
+    
+    def search_events(self, text=None, start=None, end=None, event_type=None, location=None, limit=50, cursor=None):
+        """Full-text search of event descriptions, newest first.
+
+        Every word of text must match; "gar*" matches a prefix. The other
+        filters work as in query_events, which is used when text is empty.
+        Returns (events, next_cursor) like query_events, but with text the
+        matches come in event id (insertion) order and next_cursor is the
+        last id returned. Insertion order is time order except for events
+        logged with an earlier when, e.g. a replayed trace. Only pass a
+        cursor back to the same kind of search that returned it.
+        """
+        query = _fts_query(text or "")
+        if not query:
+            return self.query_events(start, end, event_type, location, limit, cursor)
+        if cursor is not None and (not isinstance(cursor, int) or isinstance(cursor, bool)):
+            raise ValueError(f"Expected an event id cursor from a text search, got {cursor!r}")
+        conditions, params = self._filter_conditions(start, end, event_type, location)
+        # Walk the index in rowid (= insertion) order so a page only reads its own matches
+        sql = (
+            "SELECT e.id, e.ts, t.name, s.name, l.name, e.event_count, e.detail FROM events_fts f "
+            "JOIN events e ON e.id = f.rowid "
+            "JOIN event_types t ON t.code = e.type_code "
+            "LEFT JOIN sensors s ON s.id = e.sensor_id "
+            "LEFT JOIN locations l ON l.id = e.location_id "
+            "WHERE events_fts MATCH ?"
+        )
+        params.insert(0, query)
+        if cursor is not None:
+            conditions.append("f.rowid < ?")
+            params.append(cursor)
+        for condition in conditions:
+            sql += " AND " + condition
+        sql += " ORDER BY f.rowid DESC LIMIT ?"
+        rows = [self._decode_event(row) for row in self._fetchall(sql, params + [limit])]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        events = [(event_id, timestamp, event_type, event_location, description)
+                  for event_id, _, timestamp, event_type, _, event_location, _, description in rows]
+        return events, next_cursor
+    
+    def search_facets(self, text=None, start=None, end=None, event_type=None, location=None, max_scan=100000):
+        """Detection counts by event type, location and day for a search.
+
+        Without text the counts come from the hourly rollups (start/end are
+        rounded to the hour). With text the newest max_scan matches are
+        counted and "truncated" says whether there were more.
+        """
+        facets = {"type": {}, "location": {}, "day": {}, "total": 0, "truncated": False}
+        types = collections.Counter()
+        locations = collections.Counter()
+        hours = collections.Counter()
+        
+        query = _fts_query(text or "")
+        if not query:
+            types, locations, hours = (
+                dict(self.get_rollups(start, end, location, event_type, group_by=by))
+                for by in ("type", "location", "hour")
+            )
+            return self._fold_facets(facets, types, locations, hours)
+        
+        conditions, params = self._filter_conditions(start, end, event_type, location)
+        sql = (
+            "SELECT e.ts, e.type_code, e.location_id, e.event_count FROM events_fts f "
+            "JOIN events e ON e.id = f.rowid WHERE events_fts MATCH ?"
+        )
+        for condition in conditions:
+            sql += " AND " + condition
+        sql += " ORDER BY f.rowid DESC LIMIT ?"
+        rows = self._fetchall(sql, [query] + params + [max_scan + 1])
+        facets["truncated"] = len(rows) > max_scan
+        for ts, type_code, location_id, count in rows[:max_scan]:
+            types[type_code] += count
+            locations[location_id] += count
+            hours[ts - ts % 3600] += count
+        type_names = dict(self._fetchall("SELECT code, name FROM event_types"))
+        location_names = dict(self._fetchall("SELECT id, name FROM locations"))
+        types = {type_names.get(code): count for code, count in types.items()}
+        locations = {location_names.get(location_id): count for location_id, count in locations.items()}
+        return self._fold_facets(facets, types, locations, hours)
+    
+    @staticmethod
+    def _fold_facets(facets, types, locations, hours):
+        facets["type"] = dict(types)
+        facets["location"] = dict(locations)
+        # Local calendar days, formatted once per hour rather than per row
+        days = facets["day"]
+        for hour, count in hours.items():
+            day = datetime.date.fromtimestamp(hour).isoformat()
+            days[day] = days.get(day, 0) + count
+        facets["total"] = sum(hours.values())
+        return facets
+
+# Timer scheduler shared by all sensors
+class SensorScheduler:
+    """Runs many periodic jobs (one per sensor) from a single timer thread.
+
+    Jobs live in a hashed timing wheel: each slot covers one tick and a job
+    that is further away than one revolution carries a round counter, so
+    scheduling and cancelling are O(1). Due jobs run on a small thread pool
+    so a slow observer does not hold up the clock.
+    """
+    def __init__(self, tick=0.1, wheel_size=256, workers=4):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.workers = workers
+        self._slots = [{} for _ in range(wheel_size)]
+        # key -> [slot, rounds, func, interval]
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._current_tick = 0
+        self._started_at = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._executor = None
+    
+    def schedule(self, key, func, interval, delay=None):
+        """Call func every interval seconds until cancel(key).
+
+        interval is a number or a callable returning the next delay, which
+        lets sensors pick a fresh random interval every time they fire.
+        """
+        if delay is None:
+            delay = interval() if callable(interval) else interval
+        with self._lock:
+            self._cancel_locked(key)
+            job = [0, 0, func, interval]
+            self._jobs[key] = job
+            self._place(key, job, delay)
+    
+    def cancel(self, key):
+        with self._lock:
+            return self._cancel_locked(key)
+    
+    def __len__(self):
+        return len(self._jobs)
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        # Imported here: concurrent.futures pulls in logging, which is
+        # noticeable on the headless startup path
+        import concurrent.futures
+        self._stop_event.clear()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="SensorWorker"
+        )
+        with self._lock:
+            self._started_at = time.monotonic() - self._current_tick * self.tick
+        self._thread = threading.Thread(target=self._run, name="SensorScheduler")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        # Let jobs that already started finish, drop the ones still waiting
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+    
+    def _cancel_locked(self, key):
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return False
+        del self._slots[job[0]][key]
+        return True
+    
+    def _place(self, key, job, delay):
+        ticks = max(1, int(round(delay / self.tick)))
+        job[0] = (self._current_tick + ticks) % self.wheel_size
+        job[1] = (ticks - 1) // self.wheel_size
+        self._slots[job[0]][key] = job
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            next_tick_at = self._started_at + (self._current_tick + 1) * self.tick
+            wait = next_tick_at - time.monotonic()
+            if wait > 0 and self._stop_event.wait(wait):
+                break
+            self._advance()
+    
+    def _advance(self):
+        due = []
+        with self._lock:
+            self._current_tick += 1
+            slot = self._slots[self._current_tick % self.wheel_size]
+            for key, job in list(slot.items()):
+                if job[1] > 0:
+                    job[1] -= 1
+                    continue
+                del slot[key]
+                due.append(job[2])
+                interval = job[3]
+                self._place(key, job, interval() if callable(interval) else interval)
+        for func in due:
+            self._executor.submit(self._run_job, func)
+    
+    @staticmethod
+    def _run_job(func):
+        try:
+            func()
+        except Exception as e:
+            print(f"[SCHEDULER] Job {func!r} failed: {e}")
+
+# Event dispatch between sensors and their observers
+class EventDispatcher:
+    """Delivers sensor events to observers on a pool of worker threads.
+
+    Sensors only enqueue, so detection never waits on the database or the
+    GUI. The queue is bounded and the overflow policy decides what happens
+    when it is full:
+      "block"       - the sensor waits for room (up to block_timeout seconds,
+                      after which the event is dropped as drop_newest)
+      "drop_oldest" - the oldest queued event is discarded
+      "drop_newest" - the incoming event is discarded
+    """
+    OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+    
+    def __init__(self, workers=2, max_queue=1000, overflow="block", block_timeout=None):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {self.OVERFLOW_POLICIES}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._running = False
+        self._threads = []
+        self.counters = {
+            "submitted": 0,
+            "delivered": 0,
+            "dropped_oldest": 0,
+            "dropped_newest": 0,
+            "blocked": 0,
+            "errors": 0,
+        }
+        self.max_depth = 0
+        self.queue_wait = LatencyHistogram()
+        self.processing = LatencyHistogram()
+        METRICS.register_histogram("dispatch_queue_wait", self.queue_wait)
+        METRICS.register_histogram("dispatch_processing", self.processing)
+        METRICS.register_gauge("dispatch_queue_depth", self.queue_depth)
+    
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"EventDispatcher-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """Stop accepting queued work and wait for the queue to drain"""
+        with self._lock:
+            self._running = False
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+    
+    def submit(self, observer, event_data):
+        """Queue event_data for observer.update(); returns False if it was dropped"""
+        with self._lock:
+            if not self._running:
+                # Not started (or already stopped): deliver on the caller's thread
+                running = False
+            else:
+                running = True
+                self.counters["submitted"] += 1
+                if len(self._queue) >= self.max_queue:
+                    if self.overflow == "drop_newest":
+                        self.counters["dropped_newest"] += 1
+                        METRICS.inc("dispatch_dropped")
+                        return False
+                    if self.overflow == "drop_oldest":
+                        self._queue.popleft()
+                        self.counters["dropped_oldest"] += 1
+                        METRICS.inc("dispatch_dropped")
+                    else:
+                        self.counters["blocked"] += 1
+                        has_room = self._not_full.wait_for(
+                            lambda: len(self._queue) < self.max_queue or not self._running,
+                            timeout=self.block_timeout
+                        )
+                        if not has_room:
+                            self.counters["dropped_newest"] += 1
+                            METRICS.inc("dispatch_dropped")
+                            return False
+                        # Stopped while we waited: the workers may already be
+                        # gone, so nothing would read the queue any more
+                        running = self._running
+            if running:
+                self._queue.append((observer, event_data, time.perf_counter()))
+                if len(self._queue) > self.max_depth:
+                    self.max_depth = len(self._queue)
+                self._not_empty.notify()
+        if not running:
+            observer.update(event_data)
+        return True
+    
+    def queue_depth(self):
+        return len(self._queue)
+    
+    def stats(self):
+        """Counters plus queue-wait and processing latency percentiles (ms)"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["queue_depth"] = len(self._queue)
+            stats["max_depth"] = self.max_depth
+        for name, histogram in (("queue_wait", self.queue_wait), ("processing", self.processing)):
+            stats[f"{name}_p50_ms"] = histogram.percentile(0.50) * 1000
+            stats[f"{name}_p99_ms"] = histogram.percentile(0.99) * 1000
+            stats[f"{name}_max_ms"] = histogram.max * 1000
+        return stats
+    
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._queue and self._running:
+                    self._not_empty.wait()
+                if not self._queue:
+                    # Stopped and fully drained
+                    return
+                observer, event_data, enqueued_at = self._queue.popleft()
+                self._not_full.notify()
+            
+            started = time.perf_counter()
+            try:
+                observer.update(event_data)
+                failed = False
+            except Exception as e:
+                failed = True
+                print(f"[DISPATCH] {type(observer).__name__} failed to handle event: {e}")
+            finished = time.perf_counter()
+            
+            with self._lock:
+                self.counters["errors" if failed else "delivered"] += 1
+            self.queue_wait.record(started - enqueued_at)
+            self.processing.record(finished - started)
+
+# Event record passed from sensors to observers
+class SensorEvent(collections.namedtuple(
+        "SensorEvent", ["sensor_type", "sensor_name", "location", "timestamp", "detected"])):
+    """Immutable, slotted sensor event; timestamp is epoch seconds.
+
+    Observers written against the old dict events keep working:
+    event["location"] and event.get("location") read the fields by name.
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            # Only the fields; tuple methods such as count aren't keys
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
 
 # Abstract Sensor class
 class Sensor(ABC):
@@ -69,16 +1758,25 @@ class Sensor(ABC):
         self.name = name
         self.location = location
         self.observers = []
+        self.dispatcher = None
     
     def add_observer(self, observer):
         self.observers.append(observer)
     
+    def set_dispatcher(self, dispatcher):
+        self.dispatcher = dispatcher
+    
     def notify_observers(self, event_data):
+        dispatcher = self.dispatcher
         for observer in self.observers:
-            observer.update(event_data)
+            if dispatcher is not None:
+                # Hand off to the dispatcher's workers and get back to sensing
+                dispatcher.submit(observer, event_data)
+            else:
+                observer.update(event_data)
     
     @abstractmethod
-    def start_monitoring(self):
+    def start_monitoring(self, scheduler=None):
         pass
 
 # Motion Sensor implementation
@@ -88,49 +1786,308 @@ class MotionSensor(Sensor):
         self.detection_probability = detection_probability
         self.is_active = True
         self.monitoring_thread = None
+        self.scheduler = None
     
     def detect_motion(self):
+        started = time.perf_counter()
+        METRICS.inc("detection_checks")
         if random.random() < self.detection_probability:
-            event_data = {
-                "sensor_type": "motion",
-                "sensor_name": self.name,
-                "location": self.location,
-                "timestamp": datetime.datetime.now(),
-                "detected": True
-            }
-            self.notify_observers(event_data)
+            self.notify_observers(SensorEvent("motion", self.name, self.location, time.time(), True))
+            METRICS.inc("detections")
+            METRICS.observe("detect_motion", time.perf_counter() - started)
             return True
         return False
     
-    def start_monitoring(self):
+    def next_interval(self):
+        # Sleep for a random time between 3-10 seconds
+        return random.uniform(3, 10)
+    
+    def start_monitoring(self, scheduler=None):
         self.is_active = True
+        if scheduler is not None:
+            # Let the shared scheduler drive us instead of a thread of our own
+            self.scheduler = scheduler
+            scheduler.schedule(self, self.detect_motion, self.next_interval)
+            return
         self.monitoring_thread = threading.Thread(target=self._monitoring_loop)
         self.monitoring_thread.daemon = True
         self.monitoring_thread.start()
     
     def stop_monitoring(self):
         self.is_active = False
+        if self.scheduler is not None:
+            self.scheduler.cancel(self)
+            self.scheduler = None
         if self.monitoring_thread:
             self.monitoring_thread.join(timeout=1.0)
+            self.monitoring_thread = None
     
     def _monitoring_loop(self):
         while self.is_active:
             self.detect_motion()
-            # Sleep for a random time between 3-10 seconds
-            time.sleep(random.uniform(3, 10))
+            time.sleep(self.next_interval())
 
     def simulate_motion_detection(self):
         """Manually trigger a motion detection event"""
-        event_data = {
-            "sensor_type": "motion",
-            "sensor_name": self.name,
-            "location": self.location,
-            "timestamp": datetime.datetime.now(),
-            "detected": True
-        }
-        self.notify_observers(event_data)
+        self.notify_observers(SensorEvent("motion", self.name, self.location, time.time(), True))
         return True
 
+# Debounce / coalescing of repeated events
+class EventCoalescer:
+    """Folds repeats of the same key that arrive within a time window.
+
+    offer() returns True for the first event of a burst, which the caller
+    should handle as usual, and False for repeats inside the window, which
+    are only counted. Once a burst is over, drain() returns it as
+    (key, infos, folded_count, first_seen, last_seen) so the caller can write
+    one summary row for all the repeats. infos lists the distinct info
+    values of the repeats in arrival order, first_seen is the time of the
+    burst's first event. A window of 0 disables folding.
+    """
+    # Distinct infos kept per burst
+    MAX_INFOS = 100
+    
+    def __init__(self, window=0.0, windows=None):
+        self.window = window
+        # Per-key overrides of the default window
+        self.windows = dict(windows or {})
+        self._lock = threading.Lock()
+        # key -> [first_seen, last_seen, folded, {info: None}]
+        self._bursts = {}
+        self._finished = []
+    
+    def window_for(self, key):
+        return self.windows.get(key, self.window)
+    
+    def offer(self, key, when, info=None):
+        window = self.windows.get(key, self.window)
+        if window <= 0:
+            return True
+        with self._lock:
+            burst = self._bursts.get(key)
+            if burst is not None and when - burst[0] <= window:
+                burst[1] = when
+                burst[2] += 1
+                if len(burst[3]) < self.MAX_INFOS:
+                    burst[3][info] = None
+                return False
+            if burst is not None and burst[2]:
+                self._finished.append((key, list(burst[3]), burst[2], burst[0], burst[1]))
+            self._bursts[key] = [when, when, 0, {}]
+            return True
+    
+    def drain(self, now=None):
+        """Return finished bursts that folded repeats; now=None drains everything"""
+        with self._lock:
+            finished, self._finished = self._finished, []
+            for key, burst in list(self._bursts.items()):
+                if now is None or now - burst[0] > self.windows.get(key, self.window):
+                    del self._bursts[key]
+                    if burst[2]:
+                        finished.append((key, list(burst[3]), burst[2], burst[0], burst[1]))
+        return finished
+
+def _format_clock(epoch_seconds):
+    return datetime.datetime.fromtimestamp(epoch_seconds).strftime("%H:%M:%S")
+
+def _list_names(names, limit=3, separator=", "):
+    text = separator.join(names[:limit])
+    if len(names) > limit:
+        text += f" and {len(names) - limit} more"
+    return text
+
+# Rules
+class Rule:
+    """A declarative reaction to sensor events.
+
+    sensor_type, location and armed select the events the rule reacts to;
+    None matches anything. action(agent, event, rule) runs for every
+    matching event. With sequence (a list of locations) the rule instead
+    fires when detections at those locations happen in order, all within
+    window seconds of the first.
+    """
+    def __init__(self, name, action, sensor_type="motion", location=None, armed=None, sequence=None, window=30.0):
+        self.name = name
+        self.action = action
+        self.sensor_type = sensor_type
+        self.location = location
+        self.armed = armed
+        self.sequence = list(sequence) if sequence else None
+        self.window = window
+        # _starts[i] is the start time of the newest partial match that has
+        # completed the steps before i. An older partial can never finish
+        # when a newer one can't, so one slot per step is all we keep.
+        self._starts = [None] * len(self.sequence) if self.sequence else None
+    
+    def advance(self, step, when, armed):
+        """Feed a detection at sequence step; returns True when the sequence completes"""
+        if self.armed is not None and self.armed != armed:
+            return False
+        starts = self._starts
+        if step == 0:
+            start = when
+        else:
+            start = starts[step]
+            if start is None or when - start > self.window:
+                return False
+        if step == len(starts) - 1:
+            self._starts = [None] * len(starts)
+            return True
+        if starts[step + 1] is None or start > starts[step + 1]:
+            starts[step + 1] = start
+        return False
+
+class RuleEngine:
+    """Finds the rules for a sensor event by lookup instead of scanning.
+
+    Simple rules are indexed by (sensor_type, location, armed). The rules
+    for each concrete key, wildcards included, are merged once and cached,
+    so matching is one dict lookup however many rules there are. Sequence
+    rules are indexed by the (sensor_type, location) of each step and only
+    see detections at their own locations; a sequence rule with
+    sensor_type=None is indexed under None and sees every type. Rules run
+    in the order they were added.
+    """
+    def __init__(self, rules=()):
+        self.rules = {}
+        self._lock = threading.Lock()
+        self._index = {}
+        self._steps = {}
+        self._cache = {}
+        for rule in rules:
+            self.add(rule)
+    
+    def add(self, rule):
+        """Add a rule, replacing any rule with the same name"""
+        with self._lock:
+            self.rules.pop(rule.name, None)
+            self.rules[rule.name] = rule
+            self._rebuild()
+    
+    def remove(self, name):
+        with self._lock:
+            if self.rules.pop(name, None) is not None:
+                self._rebuild()
+    
+    def _rebuild(self):
+        index = {}
+        steps = {}
+        for rule in self.rules.values():
+            if rule.sequence:
+                for step, location in enumerate(rule.sequence):
+                    steps.setdefault((rule.sensor_type, location), []).append((rule, step))
+            else:
+                index.setdefault((rule.sensor_type, rule.location, rule.armed), []).append(rule)
+        # Later steps first, so one detection can't complete two steps of a rule
+        for entries in steps.values():
+            entries.sort(key=lambda entry: -entry[1])
+        self._index = index
+        self._steps = steps
+        self._cache = {}
+    
+    def match(self, sensor_type, location, armed):
+        """Simple rules for an event, in the order they were added"""
+        key = (sensor_type, location, armed)
+        rules = self._cache.get(key)
+        if rules is None:
+            index = self._index
+            found = set()
+            for rule_type in (sensor_type, None):
+                for rule_location in (location, None):
+                    for rule_armed in (armed, None):
+                        found.update(index.get((rule_type, rule_location, rule_armed), ()))
+            rules = [rule for rule in self.rules.values() if rule in found]
+            self._cache[key] = rules
+        return rules
+    
+    def evaluate(self, agent, event, armed):
+        """Run every rule the event triggers; returns how many fired"""
+        rules = self.match(event.sensor_type, event.location, armed)
+        steps = self._steps.get((event.sensor_type, event.location))
+        any_type = self._steps.get((None, event.location))
+        if any_type:
+            # Each rule's steps all sit under one key, so concatenating keeps
+            # every rule's later-steps-first order
+            steps = steps + any_type if steps else any_type
+        if steps:
+            with self._lock:
+                completed = [rule for rule, step in steps if rule.advance(step, event.timestamp, armed)]
+            if completed:
+                rules = rules + completed
+        for rule in rules:
+            rule.action(agent, event, rule)
+        if rules:
+            METRICS.inc("rules_fired", len(rules))
+        return len(rules)
+
+def _report_motion(agent, event, rule):
+    # Default while disarmed: log the detection
+    timestamp = agent.logger.log_event(
+        "MOTION",
+        f"Motion detected at {event.location} by {event.sensor_name}",
+        location=event.location,
+        sensor=event.sensor_name,
+        when=event.timestamp
+    )
+    if agent.callback:
+        # Use a function to avoid direct GUI updates from non-main thread
+        agent.callback("motion", event.location, timestamp)
+
+def _raise_intrusion(agent, event, rule):
+    # Default while armed: log the detection and raise an alert
+    timestamp = agent.logger.log_event(
+        "MOTION",
+        f"Motion detected at {event.location} by {event.sensor_name}",
+        location=event.location,
+        sensor=event.sensor_name,
+        when=event.timestamp
+    )
+    if agent.alert_system:
+        agent.alert_system.trigger_alert(
+            f"Motion detected at {event.location} by {event.sensor_name}",
+            location=event.location,
+            sensor=event.sensor_name,
+            when=event.timestamp
+        )
+    if agent.callback:
+        # Use a function to avoid direct GUI updates from non-main thread
+        agent.callback("alert", event.location, timestamp)
+
+def _describe_match(event, rule):
+    if rule.sequence:
+        return f"{rule.name}: {' then '.join(rule.sequence)} within {rule.window:g}s"
+    return f"{rule.name}: {event.sensor_type} at {event.location} by {event.sensor_name}"
+
+def _rule_alert(agent, event, rule):
+    if agent.alert_system:
+        agent.alert_system.trigger_alert(
+            _describe_match(event, rule), location=event.location, sensor=event.sensor_name, when=event.timestamp
+        )
+
+def _rule_log(agent, event, rule):
+    agent.logger.log_event(
+        "SYSTEM", _describe_match(event, rule), location=event.location, sensor=event.sensor_name, when=event.timestamp
+    )
+
+# Actions that rules in a config file can name
+RULE_ACTIONS = {"alert": _rule_alert, "log": _rule_log}
+
+def default_rules():
+    """The built-in behavior: log motion, and raise an alert when armed"""
+    return [
+        Rule("motion-disarmed", _report_motion, armed=False),
+        Rule("motion-armed", _raise_intrusion, armed=True),
+    ]
+
+def rule_from_config(spec):
+    """Build a Rule from a config dict such as
+    {"name": "entry", "sequence": ["Front Door", "Living Room"], "window": 30, "armed": true, "action": "alert"}"""
+    spec = dict(spec)
+    action = spec.pop("action", "alert")
+    if action not in RULE_ACTIONS:
+        raise ValueError(f"Rule {spec.get('name')!r}: unknown action {action!r}")
+    return Rule(action=RULE_ACTIONS[action], **spec)
+
 # Intelligent Agent - Observer for sensors
 class SecurityAgent:
     def __init__(self, name, event_logger):
@@ -139,6 +2096,51 @@ class SecurityAgent:
         self.logger = event_logger
         self.alert_system = None
         self.callback = None
+        # Debounce is off until set_debounce() gives it a window
+        self.sensor_debounce = EventCoalescer()
+        self.location_debounce = EventCoalescer()
+        self.rules = RuleEngine(default_rules())
+    
+    def add_rule(self, rule):
+        self.rules.add(rule)
+    
+    def remove_rule(self, name):
+        self.rules.remove(name)
+    
+    def set_debounce(self, sensor_window=0.0, location_window=0.0, sensor_windows=None, location_windows=None):
+        """Fold repeat motion from the same sensor/location within a window (seconds).
+
+        sensor_windows and location_windows map names to per-sensor or
+        per-location windows that override the defaults.
+        """
+        self.sensor_debounce = EventCoalescer(sensor_window, sensor_windows)
+        self.location_debounce = EventCoalescer(location_window, location_windows)
+    
+    def flush_debounced(self, now=None):
+        """Write one summary row for every finished burst of folded detections.
+
+        The first detection of a burst was already handled and logged, so the
+        row counts only the repeats. It is stamped with the last repeat and
+        stores when the burst started and ended. When the repeats came from
+        more than one sensor the row has no sensor and names them all.
+        """
+        summaries = self.sensor_debounce.drain(now) + self.location_debounce.drain(now)
+        for _, infos, folded, first_seen, last_seen in summaries:
+            location = infos[0][0]
+            sensor_names = list(dict.fromkeys(sensor_name for _, sensor_name in infos))
+            timestamp = self.logger.log_event(
+                "MOTION",
+                f"Motion detected at {location} by {_list_names(sensor_names)} "
+                f"({folded} more between {_format_clock(first_seen)} and {_format_clock(last_seen)})",
+                location=location,
+                sensor=sensor_names[0] if len(sensor_names) == 1 else None,
+                count=folded,
+                when=last_seen,
+                first_seen=first_seen
+            )
+            if self.callback:
+                self.callback("motion", location, timestamp)
+        return len(summaries)
     
     def arm(self):
         self.armed = True
@@ -157,28 +2159,32 @@ class SecurityAgent:
         self.callback = callback
     
     def update(self, event_data):
-        # Process sensor data and make decisions
-        if event_data["sensor_type"] == "motion" and event_data["detected"]:
-            location = event_data["location"]
-            timestamp = self.logger.log_event(
-                "MOTION", 
-                f"Motion detected at {location} by {event_data['sensor_name']}"
+        started = time.perf_counter()
+        self._process(event_data)
+        METRICS.observe("agent_update", time.perf_counter() - started)
+    
+    def _process(self, event_data):
+        # Process sensor data and make decisions. event_data is a SensorEvent,
+        # or a plain dict from sensors written before SensorEvent existed.
+        if not event_data["detected"]:
+            return
+        if not isinstance(event_data, SensorEvent):
+            event_data = SensorEvent(
+                event_data["sensor_type"], event_data["sensor_name"], event_data["location"],
+                event_data["timestamp"], True
             )
-            
-            if self.armed:
-                # Trigger alert if system is armed
-                if self.alert_system:
-                    self.alert_system.trigger_alert(
-                        f"Motion detected at {location} by {event_data['sensor_name']}"
-                    )
-                
-                if self.callback:
-                    # Use a function to avoid direct GUI updates from non-main thread
-                    self.callback("alert", location, timestamp)
-            else:
-                if self.callback:
-                    # Use a function to avoid direct GUI updates from non-main thread
-                    self.callback("motion", location, timestamp)
+        if isinstance(event_data.timestamp, datetime.datetime):
+            event_data = event_data._replace(timestamp=event_data.timestamp.timestamp())
+        detected_at = event_data.timestamp
+        if event_data.sensor_type == "motion":
+            info = (event_data.location, event_data.sensor_name)
+            # Repeats inside a debounce window are only counted
+            if not (self.sensor_debounce.offer(event_data.sensor_name, detected_at, info)
+                    and self.location_debounce.offer(event_data.location, detected_at, info)):
+                METRICS.inc("motion_debounced")
+                return
+        # What happens next is up to the rules
+        self.rules.evaluate(self, event_data, self.armed)
 
 # Alert System
 class AlertSystem:
@@ -186,32 +2192,161 @@ class AlertSystem:
         self.system_name = system_name
         self.logger = event_logger
         self.callback = None
+        self.coalescer = EventCoalescer()
+        # Optional NotificationDispatcher (home_security_notify)
+        self.notifications = None
     
     def set_alert_callback(self, callback):
         self.callback = callback
     
-    def trigger_alert(self, alert_message):
+    def set_notifications(self, notifications):
+        self.notifications = notifications
+    
+    def _notify(self, alert_message, location, sensor, when, count=1):
+        # Only queues the alert; notifiers deliver it on their own threads
+        self.notifications.submit({
+            "system": self.system_name,
+            "message": alert_message,
+            "location": location,
+            "sensor": sensor,
+            "timestamp": when,
+            "count": count,
+        })
+    
+    def set_coalescing(self, window=0.0, location_windows=None):
+        """Fold repeat alerts for the same location within window seconds into one"""
+        self.coalescer = EventCoalescer(window, location_windows)
+    
+    def flush_coalesced(self, now=None):
+        """Log one summary alert for every finished burst of folded alerts.
+
+        Like SecurityAgent.flush_debounced the row counts only the repeats,
+        stores the burst's first and last times and lists every distinct
+        alert folded into it.
+        """
+        summaries = self.coalescer.drain(now)
+        for _, infos, folded, first_seen, last_seen in summaries:
+            location = infos[0][2]
+            messages = list(dict.fromkeys(message for message, _, _ in infos))
+            sensors = list(dict.fromkeys(sensor for _, sensor, _ in infos))
+            sensor = sensors[0] if len(sensors) == 1 else None
+            alert_message = _list_names(messages, separator="; ")
+            timestamp = self.logger.log_event(
+                "ALERT",
+                f"Alert triggered: {alert_message} "
+                f"({folded} more between {_format_clock(first_seen)} and {_format_clock(last_seen)})",
+                location=location,
+                sensor=sensor,
+                count=folded,
+                when=last_seen,
+                first_seen=first_seen
+            )
+            if self.callback:
+                self.callback(f"{alert_message} (+{folded} repeats)", timestamp)
+            if self.notifications:
+                self._notify(f"{alert_message} (+{folded} repeats)", location, sensor, last_seen, folded)
+        return len(summaries)
+    
+    def trigger_alert(self, alert_message, location=None, sensor=None, when=None):
+        started = time.perf_counter()
+        if when is None:
+            when = time.time()
+        key = location if location is not None else alert_message
+        if not self.coalescer.offer(key, when, (alert_message, sensor, location)):
+            METRICS.inc("alerts_coalesced")
+            return None
         # Log the alert
-        timestamp = self.logger.log_event("ALERT", f"Alert triggered: {alert_message}")
+        timestamp = self.logger.log_event(
+            "ALERT", f"Alert triggered: {alert_message}", location=location, sensor=sensor, when=when
+        )
         
         if self.callback:
             self.callback(alert_message, timestamp)
+        if self.notifications:
+            self._notify(alert_message, location, sensor, when)
+        METRICS.inc("alerts")
+        METRICS.observe("trigger_alert", time.perf_counter() - started)
 
 class SecuritySystem:
-    def __init__(self, system_name="HomeSecurity"):
+    # How often finished debounce/coalescing bursts are summarized
+    COALESCE_FLUSH_INTERVAL = 1.0
+    # Larger deployments get a one-line summary instead of a line per sensor
+    LIST_SENSORS_UP_TO = 20
+    
+    def __init__(self, system_name="HomeSecurity", db_path=DB_PATH, write_behind=False,
+                 dispatch_workers=0, dispatch_queue_size=1000, overflow_policy="block",
+                 debounce_window=0.0, alert_coalesce_window=0.0, retention=None, shard_processes=0,
+                 ingest=None):
         self.system_name = system_name
-        setup_database()
-        self.event_logger = EventLogger()
+        self.db_path = db_path
+        # Seconds spent in each startup phase, see startup_report()
+        self.startup_timings = {"database": 0.0, "sensors": 0.0, "start": 0.0}
+        started = time.perf_counter()
+        setup_database(db_path)
+        self.event_logger = EventLogger(db_path, write_behind=write_behind)
+        self.startup_timings["database"] = time.perf_counter() - started
+        METRICS.register_gauge("log_queue_depth", self.event_logger.queue_depth)
         self.sensors = []
         self.agent = SecurityAgent("MainAgent", self.event_logger)
         self.alert_system = AlertSystem(system_name, self.event_logger)
         self.agent.set_alert_system(self.alert_system)
+        self.agent.set_debounce(sensor_window=debounce_window)
+        self.alert_system.set_coalescing(alert_coalesce_window)
+        self.retention = retention
+        # One timer thread drives every sensor instead of a thread per sensor
+        self.scheduler = SensorScheduler()
+        METRICS.register_gauge("scheduled_sensors", self.scheduler.__len__)
+        # Optional worker pool between sensors and the agent
+        self.dispatcher = None
+        if dispatch_workers:
+            self.dispatcher = EventDispatcher(dispatch_workers, dispatch_queue_size, overflow_policy)
+        # Optionally poll motion sensors in worker processes (home_security_shards)
+        self.shard_processes = shard_processes
+        self.shards = None
+        # Optional network ingest (home_security_ingest): IngestServer keyword arguments
+        self.ingest_options = ingest
+        self.ingest_server = None
+        # Created by add_notifier()
+        self.notifications = None
         self.system_state = "INACTIVE"
+        self.running = False
         
     def add_sensor(self, sensor):
-        self.sensors.append(sensor)
-        sensor.add_observer(self.agent)
-        self.event_logger.log_event("SYSTEM", f"Added {sensor.name} sensor at {sensor.location}")
+        self.add_sensors([sensor])
+    
+    def add_sensors(self, sensors):
+        """Register sensors with one database transaction for all of them.
+
+        Sensors only start polling when the system starts; sensors added to
+        a running system start right away.
+        """
+        started = time.perf_counter()
+        sensors = list(sensors)
+        for sensor in sensors:
+            self.sensors.append(sensor)
+            sensor.add_observer(self.agent)
+            sensor.set_dispatcher(self.dispatcher)
+        listed = len(sensors) <= self.LIST_SENSORS_UP_TO
+        self.event_logger.log_events(
+            [("SYSTEM", f"Added {sensor.name} sensor at {sensor.location}", sensor.location, sensor.name)
+             for sensor in sensors],
+            echo=listed
+        )
+        if not listed:
+            print(f"Registered {len(sensors)} sensors in {len({sensor.location for sensor in sensors})} locations")
+        if self.running:
+            for sensor in sensors:
+                sensor.start_monitoring(self.scheduler)
+        self.startup_timings["sensors"] += time.perf_counter() - started
+    
+    def startup_report(self):
+        """One line with the time each startup phase took"""
+        timings = self.startup_timings
+        return (
+            f"Startup: database {timings['database'] * 1000:.1f} ms, "
+            f"{len(self.sensors)} sensors registered in {timings['sensors'] * 1000:.1f} ms, "
+            f"start {timings['start'] * 1000:.1f} ms"
+        )
     
     def arm_system(self):
         timestamp = self.agent.arm()
@@ -229,22 +2364,125 @@ class SecuritySystem:
     def set_alert_callback(self, callback):
         self.alert_system.set_alert_callback(callback)
     
+    def add_rule(self, rule):
+        self.agent.add_rule(rule)
+    
+    def add_notifier(self, notifier):
+        """Also deliver alerts through a Notifier (see home_security_notify)"""
+        if self.notifications is None:
+            from home_security_notify import NotificationDispatcher
+            self.notifications = NotificationDispatcher(self.db_path)
+            self.alert_system.set_notifications(self.notifications)
+        self.notifications.add_notifier(notifier)
+    
     def start(self):
         print(f"\n🔒 Starting {self.system_name} security system...")
+        started = time.perf_counter()
         self.system_state = "ACTIVE"
-        for sensor in self.sensors:
-            sensor.start_monitoring()
-            print(f"  - {sensor.name} at {sensor.location} is active")
+        self.running = True
+        if self.notifications:
+            self.notifications.start()
+        if self.dispatcher:
+            self.dispatcher.start()
+        self.scheduler.start()
+        self.scheduler.schedule("coalesce-flush", self.flush_coalesced, self.COALESCE_FLUSH_INTERVAL)
+        if self.retention:
+            self.scheduler.schedule("retention", self.apply_retention, self.retention.interval)
+        local_sensors = self.sensors
+        if self.shard_processes:
+            # Only imported (with multiprocessing) when sharding is used
+            from home_security_shards import ShardCoordinator
+            sharded = [sensor for sensor in self.sensors if isinstance(sensor, MotionSensor)]
+            local_sensors = [sensor for sensor in self.sensors if not isinstance(sensor, MotionSensor)]
+            self.shards = ShardCoordinator(sharded, self.shard_processes)
+            self.shards.start()
+        for sensor in local_sensors:
+            sensor.start_monitoring(self.scheduler)
+        if len(local_sensors) <= self.LIST_SENSORS_UP_TO:
+            for sensor in local_sensors:
+                print(f"  - {sensor.name} at {sensor.location} is active")
+        else:
+            print(f"  - {len(local_sensors)} sensors are active")
+        if self.ingest_options is not None:
+            from home_security_ingest import IngestServer
+            self.ingest_server = IngestServer(self, **self.ingest_options)
+            self.ingest_server.start()
+        self.startup_timings["start"] = time.perf_counter() - started
     
     def stop(self):
         print(f"\n🛑 Stopping {self.system_name} security system...")
         self.system_state = "INACTIVE"
+        self.running = False
+        if self.ingest_server:
+            self.ingest_server.stop()
+            self.ingest_server = None
+        if self.shards:
+            self.shards.stop()
+            self.shards = None
         for sensor in self.sensors:
             sensor.stop_monitoring()
+        self.scheduler.cancel("coalesce-flush")
+        self.scheduler.cancel("retention")
+        self.scheduler.stop()
+        if self.dispatcher:
+            # Process everything the sensors already queued
+            self.dispatcher.stop()
+        # Record whatever is still folded in open bursts
+        self.agent.flush_debounced()
+        self.alert_system.flush_coalesced()
+        if self.notifications:
+            # Undelivered alerts stay in the outbox and are sent on the next start
+            self.notifications.stop()
+        # Make sure queued events reach the database before we exit
+        self.event_logger.close()
         print("System shutdown complete.")
     
-    def get_recent_events(self, limit=20):
-        return self.event_logger.get_recent_events(limit)
+    def flush_coalesced(self):
+        now = time.time()
+        self.agent.flush_debounced(now)
+        self.alert_system.flush_coalesced(now)
+    
+    def apply_retention(self):
+        """Prune one batch per retention limit; runs periodically while started"""
+        if self.retention:
+            return self.event_logger.prune(self.retention)
+        return 0
+    
+    def get_activity_totals(self, start=None, end=None, by="location", event_type=None):
+        return self.event_logger.get_activity_totals(start, end, by, event_type)
+    
+    def get_rollups(self, start=None, end=None, location=None, event_type=None):
+        return self.event_logger.get_rollups(start, end, location, event_type)
+    
+    def get_heatmap(self, event_type=None, location=None):
+        return self.event_logger.get_heatmap(event_type, location)
+    
+    def get_alert_rates(self, start=None, end=None):
+        return self.event_logger.get_alert_rates(start, end)
+    
+    def iter_events(self, start=None, end=None, event_type=None, location=None, chunk_size=5000):
+        return self.event_logger.iter_events(start, end, event_type, location, chunk_size)
+    
+    def get_recent_events(self, limit=20, event_type=None):
+        return self.event_logger.get_recent_events(limit, event_type)
+    
+    def get_dispatch_stats(self):
+        return self.dispatcher.stats() if self.dispatcher else None
+    
+    def get_metrics(self):
+        return METRICS.snapshot()
+    
+    def get_events_since(self, last_id, limit=20):
+        return self.event_logger.get_events_since(last_id, limit)
+    
+    def query_events(self, start=None, end=None, event_type=None, location=None, limit=50, cursor=None):
+        return self.event_logger.query_events(start, end, event_type, location, limit, cursor)
+    
+    def search_events(self, text=None, start=None, end=None, event_type=None, location=None, limit=50, cursor=None):
+        return self.event_logger.search_events(text, start, end, event_type, location, limit, cursor)
+    
+    def search_facets(self, text=None, start=None, end=None, event_type=None, location=None):
+        return self.event_logger.search_facets(text, start, end, event_type, location)
     
     def simulate_motion(self, sensor_index=0):
         """Manually trigger motion on a specific sensor"""
@@ -254,299 +2492,208 @@ class SecuritySystem:
                 return True
         return False
 
-# GUI Application
-class SecuritySystemApp(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-        
-        # Configure window
-        self.title("Smart Home Guardian Security System")
-        self.geometry("1000x600")
-        self.resizable(True, True)
-        
-        # Initialize security system
-        self.security_system = SecuritySystem("Smart Home Guardian")
-        self.security_system.add_sensor(MotionSensor("Front Door Sensor", "Front Door"))
-        self.security_system.add_sensor(MotionSensor("Living Room Sensor", "Living Room"))
-        self.security_system.add_sensor(MotionSensor("Back Door Sensor", "Back Door"))
-        self.security_system.add_sensor(MotionSensor("Garage Sensor", "Garage"))
-        
-        # Set callbacks
-        self.security_system.set_agent_callback(self.handle_sensor_update)
-        self.security_system.set_alert_callback(self.handle_alert)
-        
-        # Create GUI elements
-        self.create_widgets()
-        
-        # Start security system
-        self.security_system.start()
-        
-        # Update events initially
-        self.update_event_list()
-        
-    def create_widgets(self):
-        # Create main frame with two columns
-        self.grid_columnconfigure(0, weight=1)
-        self.grid_columnconfigure(1, weight=1)
-        self.grid_rowconfigure(0, weight=1)
-        
-        # Left frame - System controls and sensor status
-        self.left_frame = ctk.CTkFrame(self)
-        self.left_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
-        self.configure_left_frame()
-        
-        # Right frame - Event log and notifications
-        self.right_frame = ctk.CTkFrame(self)
-        self.right_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
-        self.configure_right_frame()
-    
-    def configure_left_frame(self):
-        self.left_frame.grid_columnconfigure(0, weight=1)
-        
-        # System title
-        title_label = ctk.CTkLabel(
-            self.left_frame, 
-            text="Smart Home Guardian", 
-            font=ctk.CTkFont(size=24, weight="bold")
-        )
-        title_label.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="w")
-        
-        # System status
-        status_frame = ctk.CTkFrame(self.left_frame)
-        status_frame.grid(row=1, column=0, padx=20, pady=10, sticky="ew")
-        status_frame.grid_columnconfigure(1, weight=1)
-        
-        status_label = ctk.CTkLabel(status_frame, text="System Status:", font=ctk.CTkFont(size=16))
-        status_label.grid(row=0, column=0, padx=10, pady=10)
-        
-        self.status_value = ctk.CTkLabel(
-            status_frame, 
-            text="DISARMED", 
-            font=ctk.CTkFont(size=16, weight="bold"),
-            text_color="orange"
-        )
-        self.status_value.grid(row=0, column=1, padx=10, pady=10, sticky="w")
-        
-        # Arm/Disarm button
-        self.arm_button = ctk.CTkButton(
-            self.left_frame,
-            text="ARM SYSTEM",
-            font=ctk.CTkFont(size=16),
-            fg_color="green",
-            command=self.toggle_system_arm
-        )
-        self.arm_button.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
-        
-        # Sensor status section
-        sensor_frame = ctk.CTkFrame(self.left_frame)
-        sensor_frame.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
-        sensor_frame.grid_columnconfigure(0, weight=1)
-        
-        sensor_title = ctk.CTkLabel(
-            sensor_frame, 
-            text="Sensor Controls", 
-            font=ctk.CTkFont(size=18, weight="bold")
-        )
-        sensor_title.grid(row=0, column=0, padx=10, pady=10, sticky="w")
-        
-        # Sensor trigger buttons
-        self.sensor_buttons = []
-        sensors = [
-            ("Front Door", 0), 
-            ("Living Room", 1), 
-            ("Back Door", 2),
-            ("Garage", 3)
-        ]
-        
-        for i, (location, idx) in enumerate(sensors):
-            sensor_btn = ctk.CTkButton(
-                sensor_frame,
-                text=f"Trigger {location} Sensor",
-                command=lambda idx=idx: self.trigger_sensor(idx)
-            )
-            sensor_btn.grid(row=i+1, column=0, padx=10, pady=5, sticky="ew")
-            self.sensor_buttons.append(sensor_btn)
-        
-        # Floor plan visualization (simplified)
-        floorplan_frame = ctk.CTkFrame(self.left_frame)
-        floorplan_frame.grid(row=4, column=0, padx=20, pady=20, sticky="ew")
-        
-        floorplan_title = ctk.CTkLabel(
-            floorplan_frame, 
-            text="Home Layout", 
-            font=ctk.CTkFont(size=18, weight="bold")
-        )
-        floorplan_title.grid(row=0, column=0, padx=10, pady=10, sticky="w")
-        
-        # Simple floor plan drawing
-        self.floorplan_canvas = ctk.CTkCanvas(floorplan_frame, width=400, height=200, bg="#f0f0f0")
-        self.floorplan_canvas.grid(row=1, column=0, padx=10, pady=10)
-        self.draw_floorplan()
-    
-    def configure_right_frame(self):
-        self.right_frame.grid_columnconfigure(0, weight=1)
-        self.right_frame.grid_rowconfigure(1, weight=1)
-        
-        # Event log header
-        events_label = ctk.CTkLabel(
-            self.right_frame, 
-            text="Security Events", 
-            font=ctk.CTkFont(size=20, weight="bold")
-        )
-        events_label.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="w")
-        
-        # Event log window (textbox)
-        self.event_log = ctk.CTkTextbox(self.right_frame, width=400, height=400)
-        self.event_log.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
-        self.event_log.configure(state="disabled")
-        
-        # Alert notification area
-        self.alert_frame = ctk.CTkFrame(self.right_frame, fg_color="transparent")
-        self.alert_frame.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
-        
-        self.alert_label = ctk.CTkLabel(
-            self.alert_frame,
-            text="No active alerts",
-            font=ctk.CTkFont(size=16),
-        )
-        self.alert_label.pack(pady=10)
-        
-        # Refresh button
-        refresh_button = ctk.CTkButton(
-            self.right_frame,
-            text="Refresh Events",
-            command=self.update_event_list
-        )
-        refresh_button.grid(row=3, column=0, padx=20, pady=20)
-    
-    def draw_floorplan(self):
-        canvas = self.floorplan_canvas
-        canvas.delete("all")
-        
-        # Draw house outline
-        canvas.create_rectangle(50, 50, 350, 180, outline="black", width=2)
-        
-        # Draw rooms
-        canvas.create_line(200, 50, 200, 180, fill="black", width=2)  # Middle divider
-        canvas.create_line(50, 115, 200, 115, fill="black", width=2)  # Top room divider
-        
-        # Label rooms
-        canvas.create_text(130, 85, text="Living Room")
-        canvas.create_text(130, 145, text="Garage")
-        canvas.create_text(275, 115, text="Bedroom")
-        
-        # Draw doors
-        canvas.create_rectangle(180, 50, 220, 52, fill="brown", outline="")  # Front door
-        canvas.create_rectangle(48, 130, 50, 150, fill="brown", outline="")  # Garage door
-        canvas.create_rectangle(348, 130, 350, 150, fill="brown", outline="")  # Back door
-        
-        # Draw sensor locations with default state
-        self.sensor_indicators = {
-            "Front Door": canvas.create_oval(195, 40, 205, 50, fill="green"),
-            "Living Room": canvas.create_oval(130, 70, 140, 80, fill="green"),
-            "Back Door": canvas.create_oval(355, 140, 365, 150, fill="green"),
-            "Garage": canvas.create_oval(90, 140, 100, 150, fill="green")
-        }
-    
-    def update_sensor_indicator(self, location, state):
-        """Update sensor indicators safely from any thread"""
-        if hasattr(self, 'sensor_indicators') and location in self.sensor_indicators:
-            color = "red" if state == "alert" else "yellow"
-            # Use after method to ensure updates happen in the main thread
-            self.after(0, lambda: self.floorplan_canvas.itemconfig(
-                self.sensor_indicators[location], fill=color)
-            )
-            
-            # Reset to green after 3 seconds
-            self.after(3000, lambda: self.floorplan_canvas.itemconfig(
-                self.sensor_indicators[location], fill="green")
-            )
-    
-    def toggle_system_arm(self):
-        if self.security_system.system_state == "ARMED":
-            timestamp = self.security_system.disarm_system()
-            self.status_value.configure(text="DISARMED", text_color="orange")
-            self.arm_button.configure(text="ARM SYSTEM", fg_color="green")
-        else:
-            timestamp = self.security_system.arm_system()
-            self.status_value.configure(text="ARMED", text_color="red")
-            self.arm_button.configure(text="DISARM SYSTEM", fg_color="red")
-        
-        self.update_event_list()
+# Default sensors, used when no config file is given
+DEFAULT_CONFIG = {
+    "system_name": "Smart Home Guardian",
+    "sensors": [
+        {"name": "Front Door Sensor", "location": "Front Door"},
+        {"name": "Living Room Sensor", "location": "Living Room"},
+        {"name": "Back Door Sensor", "location": "Back Door"},
+        {"name": "Garage Sensor", "location": "Garage"},
+    ],
+}
+
+# Floor plan drawn by the GUI. Coordinates are canvas pixels; sensors maps
+# a location to the centre of its indicator.
+DEFAULT_LAYOUT = {
+    "width": 400,
+    "height": 200,
+    "outline": [50, 50, 350, 180],
+    "walls": [
+        [200, 50, 200, 180],
+        [50, 115, 200, 115],
+    ],
+    "labels": [
+        {"text": "Living Room", "x": 130, "y": 85},
+        {"text": "Garage", "x": 130, "y": 145},
+        {"text": "Bedroom", "x": 275, "y": 115},
+    ],
+    "doors": [
+        [180, 50, 220, 52],
+        [48, 130, 50, 150],
+        [348, 130, 350, 150],
+    ],
+    "sensors": {
+        "Front Door": [200, 45],
+        "Living Room": [135, 75],
+        "Back Door": [360, 145],
+        "Garage": [95, 145],
+    },
+}
+
+def load_config(path=None):
+    """Load a JSON config file, falling back to DEFAULT_CONFIG"""
+    if path is None:
+        return DEFAULT_CONFIG
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config.get("sensors"), list):
+        raise ValueError(f"{path}: expected a \"sensors\" list")
+    names = set()
+    for index, spec in enumerate(config["sensors"]):
+        if not isinstance(spec, dict) or not spec.get("name") or not spec.get("location"):
+            raise ValueError(f"{path}: sensor {index} needs a \"name\" and a \"location\"")
+        if spec["name"] in names:
+            raise ValueError(f"{path}: duplicate sensor name {spec['name']!r}")
+        names.add(spec["name"])
+    # A layout file named in the config is relative to the config file
+    layout = config.get("layout")
+    if isinstance(layout, str) and not os.path.isabs(layout):
+        config["layout"] = os.path.join(os.path.dirname(os.path.abspath(path)), layout)
+    return config
+
+def load_layout(config=None):
+    """Return the floor plan from config["layout"] (a dict or a JSON file path), or DEFAULT_LAYOUT.
+
+    A sensor spec with a "position": [x, y] places its location's indicator,
+    so small setups can keep everything in the sensor list.
+    """
+    config = config or {}
+    layout = config.get("layout")
+    positions = {spec["location"]: spec["position"] for spec in config.get("sensors", []) if "position" in spec}
+    if layout is None:
+        if not positions:
+            return DEFAULT_LAYOUT
+        layout = DEFAULT_LAYOUT
+    if isinstance(layout, str):
+        path = layout
+        with open(path, encoding="utf-8") as f:
+            layout = json.load(f)
+    else:
+        path = "layout"
+    if not isinstance(layout.get("sensors"), dict):
+        raise ValueError(f"{path}: expected a \"sensors\" object mapping locations to [x, y]")
+    # Anything the layout leaves out is simply not drawn
+    full_layout = {"width": 400, "height": 200, "outline": None, "walls": [], "labels": [], "doors": []}
+    full_layout.update(layout)
+    full_layout["sensors"] = dict(layout["sensors"], **positions)
+    return full_layout
+
+def build_system(config, **system_options):
+    """Create a SecuritySystem and its sensors from a config dict"""
+    system = SecuritySystem(
+        config.get("system_name", "HomeSecurity"),
+        db_path=config.get("db_path", DB_PATH),
+        **system_options
+    )
+    # Windows given on the command line win over the config file; per-sensor
+    # and per-location windows from the file still apply
+    debounce = dict(config.get("debounce") or {})
+    if system_options.get("debounce_window"):
+        debounce["sensor_window"] = system_options["debounce_window"]
+    if debounce:
+        system.agent.set_debounce(**debounce)
+    if config.get("alert_coalesce_window") and not system_options.get("alert_coalesce_window"):
+        system.alert_system.set_coalescing(config["alert_coalesce_window"])
+    if config.get("retention"):
+        system.retention = RetentionPolicy(**config["retention"])
+    for spec in config.get("rules", []):
+        system.add_rule(rule_from_config(spec))
+    if config.get("notifiers"):
+        from home_security_notify import notifier_from_config
+        for spec in config["notifiers"]:
+            system.add_notifier(notifier_from_config(spec))
+    if config.get("ingest") and system.ingest_options is None:
+        system.ingest_options = config["ingest"]
+    system.add_sensors(
+        MotionSensor(spec["name"], spec["location"], spec.get("detection_probability", 0.3))
+        for spec in config["sensors"]
+    )
+    return system
+
+def run_headless(config, duration=None, arm=False, **system_options):
+    """Run the security system without a GUI until interrupted or duration elapses"""
+    setup_started = time.perf_counter()
+    system = build_system(config, **system_options)
+    if arm:
+        system.arm_system()
+    system.start()
+    ready = time.perf_counter()
+    print(
+        f"Headless startup: import {(setup_started - _IMPORT_STARTED) * 1000:.1f} ms, "
+        f"setup {(ready - setup_started) * 1000:.1f} ms, {len(system.sensors)} sensors"
+    )
+    print(system.startup_report())
     
-    def trigger_sensor(self, sensor_index):
-        self.security_system.simulate_motion(sensor_index)
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.set())
+    try:
+        stop_requested.wait(duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        system.stop()
+    return system
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Smart Home Guardian security system")
+    parser.add_argument("--headless", action="store_true", help="run without the GUI")
+    parser.add_argument("--config", help="JSON file with system_name, db_path and sensors")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds (headless only)")
+    parser.add_argument("--arm", action="store_true", help="arm the system on startup (headless only)")
+    parser.add_argument("--write-behind", action="store_true", help="batch database writes on a background thread")
+    parser.add_argument("--dispatch-workers", type=int, default=0, help="process sensor events on N worker threads")
+    parser.add_argument("--shard-processes", type=int, default=0, help="poll motion sensors in N worker processes")
+    parser.add_argument("--ingest-port", type=int, help="accept remote sensor events over TCP on this port")
+    parser.add_argument("--ingest-udp-port", type=int, help="also accept remote sensor events over UDP on this port")
+    parser.add_argument("--ingest-host", default="127.0.0.1", help="address the ingest server listens on")
+    parser.add_argument("--ingest-rate", type=float, default=100.0, help="events/sec allowed per connection or UDP source")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on localhost at this port")
+    parser.add_argument("--debounce", type=float, default=0.0, help="fold repeat motion per sensor within this many seconds")
+    parser.add_argument("--alert-window", type=float, default=0.0, help="fold repeat alerts per location within this many seconds")
+    parser.add_argument("--max-age-days", type=float, help="prune events older than this")
+    parser.add_argument("--max-rows", type=int, help="keep at most this many raw events")
+    args = parser.parse_args(argv)
     
-    def handle_sensor_update(self, event_type, location, timestamp):
-        """Safe handler for sensor updates that may come from other threads"""
-        # Schedule GUI updates to run in the main thread
-        self.after(0, lambda: self.update_sensor_indicator(location, event_type))
-        self.after(0, self.update_event_list)
-        
-        if event_type == "alert":
-            self.after(0, lambda: self.show_alert(f"INTRUDER DETECTED at {location}! - {timestamp}"))
-    
-    def handle_alert(self, message, timestamp):
-        """Safe handler for alerts that may come from other threads"""
-        # Schedule GUI updates to run in the main thread
-        self.after(0, lambda: self.show_alert(f"SECURITY ALERT: {message} - {timestamp}"))
-        self.after(0, self.update_event_list)
-    
-    def show_alert(self, message):
-        self.alert_label.configure(
-            text=message,
-            text_color="red",
-            fg_color="#ffdddd",
-            corner_radius=10
-        )
-        self.alert_frame.configure(fg_color="#ffdddd")
-        
-        # Reset after 10 seconds
-        self.after(10000, self.reset_alert_display)
-    
-    def reset_alert_display(self):
-        self.alert_label.configure(
-            text="No active alerts",
-            text_color=("gray10", "gray90"),
-            fg_color="transparent"
-        )
-        self.alert_frame.configure(fg_color="transparent")
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
     
-    def update_event_list(self):
-        # Get events from database
-        events = self.security_system.get_recent_events()
-        
-        # Clear current text
-        self.event_log.configure(state="normal")
-        self.event_log.delete("1.0", "end")
-        
-        # Insert events
-        for timestamp, event_type, description in events:
-            if event_type == "ALERT":
-                self.event_log.insert("end", f"{timestamp} - ", "timestamp")
-                self.event_log.insert("end", f"{event_type}: ", "alert")
-                self.event_log.insert("end", f"{description}\n", "alert_desc")
-            elif event_type == "MOTION":
-                self.event_log.insert("end", f"{timestamp} - ", "timestamp")
-                self.event_log.insert("end", f"{event_type}: ", "motion")
-                self.event_log.insert("end", f"{description}\n", "motion_desc")
-            else:
-                self.event_log.insert("end", f"{timestamp} - {event_type}: {description}\n", "normal")
-        
-        # Configure tags - FIXED: CustomTkinter doesn't allow font in tag_config
-        self.event_log.tag_config("timestamp", foreground="#555555")
-        self.event_log.tag_config("alert", foreground="red")  # Removed font parameter
-        self.event_log.tag_config("alert_desc", foreground="red")
-        self.event_log.tag_config("motion", foreground="blue")  # Removed font parameter
-        self.event_log.tag_config("motion_desc", foreground="blue")
-        
-        self.event_log.configure(state="disabled")
+    if not args.headless:
+        # Only the GUI needs customtkinter, so import it on demand
+        from home_security_gui import run_gui
+        run_gui(load_config(args.config))
+        return
     
-    def on_closing(self):
-        self.security_system.stop()
-        self.destroy()
+    ingest = None
+    if args.ingest_port is not None:
+        ingest = {
+            "host": args.ingest_host, "port": args.ingest_port,
+            "udp_port": args.ingest_udp_port, "rate": args.ingest_rate,
+        }
+    retention = None
+    if args.max_age_days is not None or args.max_rows is not None:
+        retention = RetentionPolicy(max_age_days=args.max_age_days, max_rows=args.max_rows)
+    run_headless(
+        load_config(args.config),
+        duration=args.duration,
+        arm=args.arm,
+        write_behind=args.write_behind,
+        dispatch_workers=args.dispatch_workers,
+        shard_processes=args.shard_processes,
+        ingest=ingest,
+        debounce_window=args.debounce,
+        alert_coalesce_window=args.alert_window,
+        retention=retention,
+    )
+
+def __getattr__(name):
+    # Keep `from home_security import SecuritySystemApp` working without
+    # importing the GUI toolkit for headless users
+    if name == "SecuritySystemApp":
+        from home_security_gui import SecuritySystemApp
+        return SecuritySystemApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    app = SecuritySystemApp()
-    app.protocol("WM_DELETE_WINDOW", app.on_closing)
-    app.mainloop()
\ No newline at end of file
+    main()
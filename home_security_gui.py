@@ -0,0 +1,597 @@
+import heapq
+import threading
+import time
+import customtkinter as ctk
+from home_security import METRICS, DEFAULT_CONFIG, build_system, load_layout
+
+# Set appearance mode and default color theme
+ctk.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
+ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
+
+# Floor plan
+class FloorPlanRenderer:
+    """Draws a floor plan layout and its sensor indicators on a canvas.
+
+    set_state() may be called from any thread. Changes are collected and
+    applied in one canvas pass per frame tick on the Tk thread, so a burst
+    of events costs one redraw per indicator. An indicator goes back to idle
+    HOLD_SECONDS after its last event; expiries are kept in one heap and
+    checked on the same tick, which only runs while there is work to do.
+    """
+    FRAME_MS = 33
+    HOLD_SECONDS = 3.0
+    RADIUS = 5
+    COLORS = {"idle": "green", "motion": "yellow", "alert": "red"}
+    # An alert isn't downgraded to motion before it expires
+    PRIORITY = {"idle": 0, "motion": 1, "alert": 2}
+    
+    def __init__(self, canvas, layout):
+        self.canvas = canvas
+        self.layout = layout
+        self.indicators = {}
+        # location -> state, state drawn and expiry time of the last event
+        self.states = {}
+        self.drawn = {}
+        self.expires = {}
+        self._expiry_heap = []
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._tick_scheduled = False
+    
+    def draw(self):
+        canvas = self.canvas
+        layout = self.layout
+        canvas.delete("all")
+        canvas.configure(width=layout["width"], height=layout["height"])
+        if layout["outline"]:
+            canvas.create_rectangle(*layout["outline"], outline="black", width=2)
+        for wall in layout["walls"]:
+            canvas.create_line(*wall, fill="black", width=2)
+        for label in layout["labels"]:
+            canvas.create_text(label["x"], label["y"], text=label["text"])
+        for door in layout["doors"]:
+            canvas.create_rectangle(*door, fill="brown", outline="")
+        
+        r = self.RADIUS
+        self.indicators = {
+            location: canvas.create_oval(x - r, y - r, x + r, y + r, fill=self.COLORS["idle"])
+            for location, (x, y) in layout["sensors"].items()
+        }
+        self.states = dict.fromkeys(self.indicators, "idle")
+        self.drawn = dict.fromkeys(self.indicators, "idle")
+        self.expires.clear()
+        self._expiry_heap = []
+    
+    def set_state(self, location, state):
+        """Queue an indicator change; safe to call from any thread"""
+        if location not in self.indicators:
+            return
+        with self._lock:
+            current = self._pending.get(location)
+            if current is None or self.PRIORITY[state] >= self.PRIORITY[current]:
+                self._pending[location] = state
+            if self._tick_scheduled:
+                return
+            self._tick_scheduled = True
+        self.canvas.after(self.FRAME_MS, self._tick)
+    
+    def _tick(self):
+        started = time.perf_counter()
+        now = time.monotonic()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        
+        for location, state in pending.items():
+            if self.PRIORITY[state] < self.PRIORITY[self.states[location]] and self.expires.get(location, 0) > now:
+                state = self.states[location]
+            self.states[location] = state
+            expiry = now + self.HOLD_SECONDS
+            self.expires[location] = expiry
+            heapq.heappush(self._expiry_heap, (expiry, location))
+        
+        # Expire indicators; heap entries superseded by a later event are skipped
+        touched = set(pending)
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expiry, location = heapq.heappop(heap)
+            if self.expires.get(location) == expiry:
+                del self.expires[location]
+                self.states[location] = "idle"
+                touched.add(location)
+        
+        # One canvas pass for everything that changed since the last frame
+        changed = 0
+        for location in touched:
+            state = self.states[location]
+            if self.drawn[location] != state:
+                self.canvas.itemconfig(self.indicators[location], fill=self.COLORS[state])
+                self.drawn[location] = state
+                changed += 1
+        
+        with self._lock:
+            # Keep ticking while something is pending or still lit
+            if self._pending or heap:
+                self.canvas.after(self.FRAME_MS, self._tick)
+            else:
+                self._tick_scheduled = False
+        METRICS.inc("gui_indicator_updates", changed)
+        METRICS.observe("gui_floorplan_frame", time.perf_counter() - started)
+
+# GUI Application
+class SecuritySystemApp(ctk.CTk):
+    # Rows kept in the event log textbox
+    MAX_EVENT_ROWS = 100
+    # Refresh requests are coalesced into at most one redraw per interval
+    REFRESH_INTERVAL_MS = 50
+    # Search results loaded per "More results" click
+    SEARCH_PAGE_SIZE = 50
+    # More locations than this get a drop-down instead of a button each
+    MAX_SENSOR_BUTTONS = 8
+    # Analytics heatmap: pixels per hour cell and the day rows, Monday first
+    HEATMAP_CELL = 14
+    HEATMAP_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+    
+    def __init__(self, config=None):
+        super().__init__()
+        config = config or DEFAULT_CONFIG
+        self.layout = load_layout(config)
+        
+        # Event log state: rows are appended incrementally by id
+        self.last_event_id = 0
+        self.event_rows = 0
+        self.pending_alert = None
+        self.alert_reset_job = None
+        self._refresh_pending = False
+        self._refresh_requested_at = 0.0
+        self._refresh_lock = threading.Lock()
+        # Current search: its filters and the cursor of the next page
+        self.search_filters = {}
+        self.search_cursor = None
+        
+        # Initialize security system with the sensors from the config
+        self.security_system = build_system(config)
+        # Manual triggers fire the first sensor at each location
+        self.location_sensors = {}
+        for index, sensor in enumerate(self.security_system.sensors):
+            self.location_sensors.setdefault(sensor.location, index)
+        
+        # Configure window
+        self.title(f"{self.security_system.system_name} Security System")
+        self.geometry("1000x600")
+        self.resizable(True, True)
+        
+        # Set callbacks
+        self.security_system.set_agent_callback(self.handle_sensor_update)
+        self.security_system.set_alert_callback(self.handle_alert)
+        
+        # Create GUI elements
+        self.create_widgets()
+        
+        # Start security system
+        self.security_system.start()
+        print(self.security_system.startup_report())
+        
+        # Update events initially
+        self.update_event_list()
+        
+    def create_widgets(self):
+        # Create main frame with two columns
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        
+        # Left frame - System controls and sensor status
+        self.left_frame = ctk.CTkFrame(self)
+        self.left_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        self.configure_left_frame()
+        
+        # Right frame - Event log and notifications
+        self.right_frame = ctk.CTkFrame(self)
+        self.right_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
+        self.configure_right_frame()
+    
+    def configure_left_frame(self):
+        self.left_frame.grid_columnconfigure(0, weight=1)
+        
+        # System title
+        title_label = ctk.CTkLabel(
+            self.left_frame, 
+            text=self.security_system.system_name, 
+            font=ctk.CTkFont(size=24, weight="bold")
+        )
+        title_label.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="w")
+        
+        # System status
+        status_frame = ctk.CTkFrame(self.left_frame)
+        status_frame.grid(row=1, column=0, padx=20, pady=10, sticky="ew")
+        status_frame.grid_columnconfigure(1, weight=1)
+        
+        status_label = ctk.CTkLabel(status_frame, text="System Status:", font=ctk.CTkFont(size=16))
+        status_label.grid(row=0, column=0, padx=10, pady=10)
+        
+        self.status_value = ctk.CTkLabel(
+            status_frame, 
+            text="DISARMED", 
+            font=ctk.CTkFont(size=16, weight="bold"),
+            text_color="orange"
+        )
+        self.status_value.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+        
+        # Arm/Disarm button
+        self.arm_button = ctk.CTkButton(
+            self.left_frame,
+            text="ARM SYSTEM",
+            font=ctk.CTkFont(size=16),
+            fg_color="green",
+            command=self.toggle_system_arm
+        )
+        self.arm_button.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
+        
+        # Sensor status section
+        sensor_frame = ctk.CTkFrame(self.left_frame)
+        sensor_frame.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
+        sensor_frame.grid_columnconfigure(0, weight=1)
+        
+        sensor_title = ctk.CTkLabel(
+            sensor_frame, 
+            text="Sensor Controls", 
+            font=ctk.CTkFont(size=18, weight="bold")
+        )
+        sensor_title.grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        
+        # Sensor trigger buttons, one per configured location
+        self.sensor_buttons = []
+        locations = list(self.location_sensors)
+        if len(locations) <= self.MAX_SENSOR_BUTTONS:
+            for i, location in enumerate(locations):
+                sensor_btn = ctk.CTkButton(
+                    sensor_frame,
+                    text=f"Trigger {location} Sensor",
+                    command=lambda idx=self.location_sensors[location]: self.trigger_sensor(idx)
+                )
+                sensor_btn.grid(row=i+1, column=0, padx=10, pady=5, sticky="ew")
+                self.sensor_buttons.append(sensor_btn)
+        elif locations:
+            # Too many for a button each: pick the location, then trigger it
+            self.sensor_location = ctk.CTkOptionMenu(sensor_frame, values=locations)
+            self.sensor_location.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+            sensor_btn = ctk.CTkButton(
+                sensor_frame,
+                text="Trigger Sensor",
+                command=lambda: self.trigger_sensor(self.location_sensors[self.sensor_location.get()])
+            )
+            sensor_btn.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
+            self.sensor_buttons.append(sensor_btn)
+        
+        # Floor plan visualization (simplified)
+        floorplan_frame = ctk.CTkFrame(self.left_frame)
+        floorplan_frame.grid(row=4, column=0, padx=20, pady=20, sticky="ew")
+        
+        floorplan_title = ctk.CTkLabel(
+            floorplan_frame, 
+            text="Home Layout", 
+            font=ctk.CTkFont(size=18, weight="bold")
+        )
+        floorplan_title.grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        
+        # Floor plan drawn from the layout
+        self.floorplan_canvas = ctk.CTkCanvas(
+            floorplan_frame, width=self.layout["width"], height=self.layout["height"], bg="#f0f0f0"
+        )
+        self.floorplan_canvas.grid(row=1, column=0, padx=10, pady=10)
+        self.floorplan = FloorPlanRenderer(self.floorplan_canvas, self.layout)
+        self.draw_floorplan()
+    
+    def configure_right_frame(self):
+        self.right_frame.grid_columnconfigure(0, weight=1)
+        self.right_frame.grid_rowconfigure(1, weight=1)
+        
+        # Event log header
+        events_label = ctk.CTkLabel(
+            self.right_frame, 
+            text="Security Events", 
+            font=ctk.CTkFont(size=20, weight="bold")
+        )
+        events_label.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="w")
+        
+        # The live event log and the history search share the space as tabs
+        self.event_tabs = ctk.CTkTabview(self.right_frame)
+        self.event_tabs.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
+        live_tab = self.event_tabs.add("Live")
+        live_tab.grid_columnconfigure(0, weight=1)
+        live_tab.grid_rowconfigure(0, weight=1)
+        self.configure_search_tab(self.event_tabs.add("Search"))
+        self.configure_analytics_tab(self.event_tabs.add("Analytics"))
+        
+        # Event log window (textbox)
+        self.event_log = ctk.CTkTextbox(live_tab, width=400, height=400)
+        self.event_log.grid(row=0, column=0, sticky="nsew")
+        
+        # Configure tags once - CustomTkinter doesn't allow font in tag_config
+        self.event_log.tag_config("timestamp", foreground="#555555")
+        self.event_log.tag_config("alert", foreground="red")
+        self.event_log.tag_config("alert_desc", foreground="red")
+        self.event_log.tag_config("motion", foreground="blue")
+        self.event_log.tag_config("motion_desc", foreground="blue")
+        self.event_log.configure(state="disabled")
+        
+        # Alert notification area
+        self.alert_frame = ctk.CTkFrame(self.right_frame, fg_color="transparent")
+        self.alert_frame.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
+        
+        self.alert_label = ctk.CTkLabel(
+            self.alert_frame,
+            text="No active alerts",
+            font=ctk.CTkFont(size=16),
+        )
+        self.alert_label.pack(pady=10)
+        
+        # Refresh button
+        refresh_button = ctk.CTkButton(
+            self.right_frame,
+            text="Refresh Events",
+            command=self.update_event_list
+        )
+        refresh_button.grid(row=3, column=0, padx=20, pady=20)
+    
+    def configure_search_tab(self, tab):
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(2, weight=1)
+        
+        # Search text, event type filter and button
+        search_bar = ctk.CTkFrame(tab, fg_color="transparent")
+        search_bar.grid(row=0, column=0, sticky="ew")
+        search_bar.grid_columnconfigure(0, weight=1)
+        
+        self.search_entry = ctk.CTkEntry(search_bar, placeholder_text="Search events, e.g. garage")
+        self.search_entry.grid(row=0, column=0, padx=(0, 5), pady=5, sticky="ew")
+        self.search_entry.bind("<Return>", lambda event: self.run_search())
+        
+        self.search_type = ctk.CTkOptionMenu(search_bar, values=["All types", "ALERT", "MOTION", "SYSTEM"], width=110)
+        self.search_type.grid(row=0, column=1, padx=5, pady=5)
+        
+        search_button = ctk.CTkButton(search_bar, text="Search", width=80, command=self.run_search)
+        search_button.grid(row=0, column=2, padx=(5, 0), pady=5)
+        
+        # Facet counts for the current search
+        self.facet_label = ctk.CTkLabel(tab, text="", anchor="w", justify="left", wraplength=380)
+        self.facet_label.grid(row=1, column=0, pady=5, sticky="ew")
+        
+        self.search_results = ctk.CTkTextbox(tab, width=400, height=300)
+        self.search_results.grid(row=2, column=0, sticky="nsew")
+        self.search_results.configure(state="disabled")
+        
+        # Further pages are only fetched when asked for
+        self.more_button = ctk.CTkButton(tab, text="More results", command=self.load_search_page, state="disabled")
+        self.more_button.grid(row=3, column=0, pady=5)
+    
+    def run_search(self):
+        event_type = self.search_type.get()
+        self.search_filters = {
+            "text": self.search_entry.get().strip() or None,
+            "event_type": None if event_type == "All types" else event_type,
+        }
+        self.search_cursor = None
+        
+        facets = self.security_system.search_facets(**self.search_filters)
+        lines = [f"{facets['total']:,} detections" + (" (newest matches only)" if facets["truncated"] else "")]
+        for facet in ("type", "location"):
+            top = sorted(facets[facet].items(), key=lambda item: -item[1])[:6]
+            lines.append(" · ".join(f"{name} {count:,}" for name, count in top))
+        self.facet_label.configure(text="\n".join(line for line in lines if line))
+        
+        self.search_results.configure(state="normal")
+        self.search_results.delete("1.0", "end")
+        self.search_results.configure(state="disabled")
+        self.load_search_page()
+    
+    def load_search_page(self):
+        events, self.search_cursor = self.security_system.search_events(
+            limit=self.SEARCH_PAGE_SIZE, cursor=self.search_cursor, **self.search_filters
+        )
+        self.search_results.configure(state="normal")
+        for _, timestamp, event_type, location, description in events:
+            self.search_results.insert("end", f"{timestamp} - {event_type}: {description}\n")
+        if not events and self.search_results.get("1.0", "end").strip() == "":
+            self.search_results.insert("end", "No matching events\n")
+        self.search_results.configure(state="disabled")
+        self.more_button.configure(state="normal" if self.search_cursor else "disabled")
+    
+    def configure_analytics_tab(self, tab):
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(2, weight=1)
+        
+        # Location and event type filters for the heatmap
+        controls = ctk.CTkFrame(tab, fg_color="transparent")
+        controls.grid(row=0, column=0, sticky="ew")
+        
+        self.analytics_location = ctk.CTkOptionMenu(
+            controls, values=["All locations"], width=150, command=lambda choice: self.refresh_analytics()
+        )
+        self.analytics_location.grid(row=0, column=0, padx=(0, 5), pady=5)
+        
+        self.analytics_type = ctk.CTkOptionMenu(
+            controls, values=["All types", "ALERT", "MOTION"], width=110, command=lambda choice: self.refresh_analytics()
+        )
+        self.analytics_type.grid(row=0, column=1, padx=5, pady=5)
+        
+        analytics_button = ctk.CTkButton(controls, text="Refresh", width=80, command=self.refresh_analytics)
+        analytics_button.grid(row=0, column=2, padx=(5, 0), pady=5)
+        
+        # Hour-of-week heatmap: one row per day, one column per hour
+        cell = self.HEATMAP_CELL
+        self.heatmap_canvas = ctk.CTkCanvas(tab, width=40 + 24 * cell, height=20 + 7 * cell, bg="white", highlightthickness=0)
+        self.heatmap_canvas.grid(row=1, column=0, pady=5)
+        
+        # Alert rates per location
+        self.rates_text = ctk.CTkTextbox(tab, width=400, height=150, font=ctk.CTkFont(family="Courier", size=12))
+        self.rates_text.grid(row=2, column=0, sticky="nsew")
+        self.rates_text.configure(state="disabled")
+        
+        self.refresh_analytics()
+    
+    def refresh_analytics(self):
+        """Redraw the heatmap and alert rates from the precomputed counters"""
+        event_type = self.analytics_type.get()
+        heatmap = self.security_system.get_heatmap(None if event_type == "All types" else event_type)
+        self.analytics_location.configure(values=["All locations"] + sorted(name for name in heatmap if name is not None))
+        selected = self.analytics_location.get()
+        if selected == "All locations":
+            counts = [sum(hour) for hour in zip(*heatmap.values())] if heatmap else [0] * 168
+        else:
+            counts = heatmap.get(selected, [0] * 168)
+        self.draw_heatmap(counts)
+        
+        rates = self.security_system.get_alert_rates()
+        lines = [f"{'Location':<16}{'Alerts':>8}{'Per day':>9}{'Of motion':>11}"]
+        for name, rate in sorted(rates.items(), key=lambda item: -item[1]["alerts"]):
+            ratio = f"{rate['alert_ratio']:.0%}" if rate["alert_ratio"] is not None else "-"
+            lines.append(f"{(name or '(none)')[:15]:<16}{rate['alerts']:>8,}{rate['alerts_per_day']:>9.1f}{ratio:>11}")
+        self.rates_text.configure(state="normal")
+        self.rates_text.delete("1.0", "end")
+        self.rates_text.insert("end", "\n".join(lines) if rates else "No alerts or motion recorded yet")
+        self.rates_text.configure(state="disabled")
+    
+    def draw_heatmap(self, counts):
+        canvas = self.heatmap_canvas
+        canvas.delete("all")
+        cell = self.HEATMAP_CELL
+        left, top = 40, 20
+        peak = max(counts) or 1
+        for hour in range(0, 24, 6):
+            canvas.create_text(left + hour * cell, top - 10, text=str(hour), anchor="w")
+        for day, name in enumerate(self.HEATMAP_DAYS):
+            y = top + day * cell
+            canvas.create_text(left - 5, y + cell / 2, text=name, anchor="e")
+            for hour in range(24):
+                # White for no activity up to red at the busiest hour
+                shade = 255 - int(215 * counts[day * 24 + hour] / peak)
+                x = left + hour * cell
+                canvas.create_rectangle(x, y, x + cell, y + cell, fill=f"#ff{shade:02x}{shade:02x}", outline="#eeeeee")
+    
+    def draw_floorplan(self):
+        self.floorplan.draw()
+    
+    def update_sensor_indicator(self, location, state):
+        """Update sensor indicators safely from any thread"""
+        self.floorplan.set_state(location, state)
+    
+    def toggle_system_arm(self):
+        if self.security_system.system_state == "ARMED":
+            timestamp = self.security_system.disarm_system()
+            self.status_value.configure(text="DISARMED", text_color="orange")
+            self.arm_button.configure(text="ARM SYSTEM", fg_color="green")
+        else:
+            timestamp = self.security_system.arm_system()
+            self.status_value.configure(text="ARMED", text_color="red")
+            self.arm_button.configure(text="DISARM SYSTEM", fg_color="red")
+        
+        self.update_event_list()
+    
+    def trigger_sensor(self, sensor_index):
+        self.security_system.simulate_motion(sensor_index)
+    
+    def handle_sensor_update(self, event_type, location, timestamp):
+        """Safe handler for sensor updates that may come from other threads"""
+        # The renderer batches indicator changes into its next frame
+        self.update_sensor_indicator(location, event_type)
+        
+        if event_type == "alert":
+            self.pending_alert = f"INTRUDER DETECTED at {location}! - {timestamp}"
+        self.request_event_refresh()
+    
+    def handle_alert(self, message, timestamp):
+        """Safe handler for alerts that may come from other threads"""
+        self.pending_alert = f"SECURITY ALERT: {message} - {timestamp}"
+        self.request_event_refresh()
+    
+    def request_event_refresh(self):
+        """Schedule one event log refresh, however many events arrive before it runs"""
+        with self._refresh_lock:
+            if self._refresh_pending:
+                METRICS.inc("gui_refresh_coalesced")
+                return
+            self._refresh_pending = True
+            self._refresh_requested_at = time.perf_counter()
+        # Use after method to ensure updates happen in the main thread
+        self.after(self.REFRESH_INTERVAL_MS, self._run_event_refresh)
+    
+    def _run_event_refresh(self):
+        started = time.perf_counter()
+        with self._refresh_lock:
+            self._refresh_pending = False
+            METRICS.observe("gui_refresh_delay", started - self._refresh_requested_at)
+        # Only the latest alert of a burst is worth showing
+        alert, self.pending_alert = self.pending_alert, None
+        if alert:
+            self.show_alert(alert)
+        self.update_event_list()
+        METRICS.observe("gui_refresh", time.perf_counter() - started)
+    
+    def show_alert(self, message):
+        self.alert_label.configure(
+            text=message,
+            text_color="red",
+            fg_color="#ffdddd",
+            corner_radius=10
+        )
+        self.alert_frame.configure(fg_color="#ffdddd")
+        
+        # Reset after 10 seconds, counted from the latest alert
+        if self.alert_reset_job is not None:
+            self.after_cancel(self.alert_reset_job)
+        self.alert_reset_job = self.after(10000, self.reset_alert_display)
+    
+    def reset_alert_display(self):
+        self.alert_reset_job = None
+        self.alert_label.configure(
+            text="No active alerts",
+            text_color=("gray10", "gray90"),
+            fg_color="transparent"
+        )
+        self.alert_frame.configure(fg_color="transparent")
+    
+    def update_event_list(self):
+        # Only fetch events we haven't shown yet (newest first)
+        events = self.security_system.get_events_since(self.last_event_id, self.MAX_EVENT_ROWS)
+        if not events:
+            return
+        self.last_event_id = events[0][0]
+        
+        self.event_log.configure(state="normal")
+        
+        # New rows go on top; a right-gravity mark keeps them in order
+        self.event_log.mark_set("new_events", "1.0")
+        self.event_log.mark_gravity("new_events", "right")
+        for _, timestamp, event_type, description in events:
+            if event_type == "ALERT":
+                self.event_log.insert("new_events", f"{timestamp} - ", "timestamp")
+                self.event_log.insert("new_events", f"{event_type}: ", "alert")
+                self.event_log.insert("new_events", f"{description}\n", "alert_desc")
+            elif event_type == "MOTION":
+                self.event_log.insert("new_events", f"{timestamp} - ", "timestamp")
+                self.event_log.insert("new_events", f"{event_type}: ", "motion")
+                self.event_log.insert("new_events", f"{description}\n", "motion_desc")
+            else:
+                self.event_log.insert("new_events", f"{timestamp} - {event_type}: {description}\n", "normal")
+        self.event_log.mark_unset("new_events")
+        
+        # Trim the oldest rows off the bottom
+        self.event_rows += len(events)
+        if self.event_rows > self.MAX_EVENT_ROWS:
+            self.event_log.delete(f"{self.MAX_EVENT_ROWS + 1}.0", "end")
+            self.event_rows = self.MAX_EVENT_ROWS
+        
+        self.event_log.configure(state="disabled")
+    
+    def on_closing(self):
+        self.security_system.stop()
+        self.destroy()
+
+def run_gui(config=None):
+    app = SecuritySystemApp(config)
+    app.protocol("WM_DELETE_WINDOW", app.on_closing)
+    app.mainloop()
+
+if __name__ == "__main__":
+    run_gui()
@@ -0,0 +1,301 @@
+"""Network ingest of sensor events from remote devices.
+
+IngestServer runs one asyncio event loop on its own thread and accepts
+events over TCP and, optionally, UDP. Every event is one line:
+
+    sensor_name|location[|timestamp[|sensor_type[|detected]]]\\n
+
+for example "Porch Cam|Porch|1712345678.25". The timestamp (epoch seconds)
+defaults to the time the line arrived, sensor_type to "motion" and detected
+to 1. A UDP datagram may carry several lines. Valid events are collected
+into batches and handed to a delivery thread that feeds SecurityAgent (or
+the system's dispatcher), so no connection gets a thread of its own and the
+event loop never waits on the database.
+
+Each TCP connection and each UDP source address has a token bucket of
+rate events/sec with room for burst events. Lines a TCP connection sends
+beyond its tokens wait in its buffer, and the connection isn't read again
+until the bucket has refilled (the sender feels TCP backpressure); UDP
+lines over the limit are dropped.
+"""
+import asyncio
+import math
+import queue
+import threading
+import time
+
+from home_security import SensorEvent, METRICS
+
+MAX_NAME_LENGTH = 128
+# Timestamps further than this from the server clock are rejected
+MAX_CLOCK_SKEW = 86400.0
+# A TCP connection is closed after this many invalid lines
+MAX_ERRORS = 100
+
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, count, rate, burst, now):
+        """Spend count tokens; returns the token balance afterwards (negative = over the limit)"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate) - count
+        self.updated = now
+        return self.tokens
+
+    def available(self, rate, burst, now):
+        """Refill up to now and return the token balance without spending any"""
+        return self.take(0, rate, burst, now)
+
+
+class _LineProtocol(asyncio.Protocol):
+    """One TCP connection: split lines, apply the rate limit, pass lines on"""
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = b""
+        self.errors = 0
+        self.paused = False
+        self.bucket = _TokenBucket(server.burst, time.monotonic())
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections.add(self)
+        METRICS.inc("ingest_connections")
+
+    def connection_lost(self, exc):
+        self.server.connections.discard(self)
+
+    def data_received(self, data):
+        self.buffer += data
+        self._consume()
+
+    def _consume(self):
+        """Ingest as many buffered lines as the bucket has tokens for"""
+        server = self.server
+        lines = self.buffer.split(b"\n")
+        partial = lines.pop()
+        if len(partial) > server.max_line:
+            METRICS.inc("ingest_invalid")
+            self.transport.close()
+            return
+        now = time.monotonic()
+        allowed = max(0, int(self.bucket.available(server.rate, server.burst, now)))
+        if allowed < len(lines):
+            # Over the limit: keep the rest and stop reading until the bucket
+            # can pay for it (or a full burst), so the sender feels backpressure
+            METRICS.inc("ingest_throttled")
+            waiting = lines[allowed:]
+            lines = lines[:allowed]
+            self.buffer = b"\n".join(waiting + [partial])
+            needed = min(len(waiting), server.burst) - (self.bucket.tokens - len(lines))
+            if not self.paused:
+                self.paused = True
+                self.transport.pause_reading()
+            server.loop.call_later(needed / server.rate, self._resume)
+        else:
+            self.buffer = partial
+        if not lines:
+            return
+        self.bucket.take(len(lines), server.rate, server.burst, now)
+        self.errors += server.ingest_lines(lines)
+        if self.errors > MAX_ERRORS:
+            self.transport.close()
+
+    def _resume(self):
+        if self.transport.is_closing():
+            return
+        self.paused = False
+        self._consume()
+        if not self.paused:
+            self.transport.resume_reading()
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """UDP: lines over a source address's limit are dropped"""
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        server = self.server
+        lines = data.split(b"\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        now = time.monotonic()
+        bucket = server.udp_buckets.get(addr)
+        if bucket is None:
+            bucket = server.udp_buckets[addr] = _TokenBucket(server.burst, now)
+        balance = bucket.take(len(lines), server.rate, server.burst, now)
+        if balance < 0:
+            over = min(len(lines), math.ceil(-balance))
+            bucket.tokens += over
+            METRICS.inc("ingest_rate_limited", over)
+            lines = lines[:len(lines) - over]
+        if lines:
+            server.ingest_lines(lines)
+
+
+class IngestServer:
+    """Accepts remote sensor events and feeds them to a SecuritySystem"""
+    def __init__(self, system, host="127.0.0.1", port=9555, udp_port=None, rate=100.0, burst=None,
+                 batch_size=512, flush_interval=0.01, max_line=1024, max_pending_batches=1024):
+        self.system = system
+        self.host = host
+        self.port = port
+        self.udp_port = udp_port
+        self.rate = rate
+        # At least one token, or a throttled connection could never resume
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_line = max_line
+        self.connections = set()
+        self.udp_buckets = {}
+        self.loop = None
+        self._batch = []
+        # name -> the same str object, so repeated names share one string
+        self._names = {}
+        self._deliveries = queue.Queue(max_pending_batches)
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._loop_thread = None
+        self._delivery_thread = None
+        self._tcp_server = None
+        self._udp_transport = None
+
+    def start(self):
+        self._delivery_thread = threading.Thread(target=self._deliver_loop, name="IngestDelivery", daemon=True)
+        self._delivery_thread.start()
+        self._loop_thread = threading.Thread(target=self._run, name="IngestServer", daemon=True)
+        self._loop_thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            self._deliveries.put(None)
+            self._delivery_thread.join()
+            raise self._startup_error
+        METRICS.register_gauge("ingest_open_connections", lambda: len(self.connections))
+        METRICS.register_gauge("ingest_pending_batches", self._deliveries.qsize)
+        print(f"  - Ingest server listening on {self.host}:{self.port} (TCP)"
+              + (f" and {self.udp_port} (UDP)" if self.udp_port is not None else ""))
+
+    def stop(self):
+        """Stop accepting events, then deliver everything already received"""
+        if self._loop_thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join()
+        self._loop_thread = None
+        self._deliveries.put(None)
+        self._delivery_thread.join()
+
+    def _run(self):
+        loop = self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._tcp_server = loop.run_until_complete(loop.create_server(
+                lambda: _LineProtocol(self), self.host, self.port, backlog=4096, reuse_address=True
+            ))
+            self.port = self._tcp_server.sockets[0].getsockname()[1]
+            if self.udp_port is not None:
+                self._udp_transport, _ = loop.run_until_complete(loop.create_datagram_endpoint(
+                    lambda: _DatagramProtocol(self), local_addr=(self.host, self.udp_port)
+                ))
+                self.udp_port = self._udp_transport.get_extra_info("sockname")[1]
+        except OSError as e:
+            self._startup_error = e
+            self._ready.set()
+            loop.close()
+            return
+        loop.call_later(self.flush_interval, self._tick)
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._tcp_server.close()
+            if self._udp_transport is not None:
+                self._udp_transport.close()
+            for connection in list(self.connections):
+                connection.transport.close()
+            # Let the transports finish closing
+            loop.run_until_complete(asyncio.sleep(0))
+            self._hand_off()
+            loop.close()
+
+    def ingest_lines(self, lines):
+        """Parse and queue lines on the event loop thread; returns how many were invalid"""
+        now = time.time()
+        batch = self._batch
+        names = self._names
+        invalid = 0
+        for line in lines:
+            try:
+                fields = line.decode("utf-8").rstrip("\r").split("|")
+                if not 2 <= len(fields) <= 5:
+                    raise ValueError("expected 2 to 5 fields")
+                sensor_name, location = fields[0], fields[1]
+                if not sensor_name or not location or len(sensor_name) > MAX_NAME_LENGTH or len(location) > MAX_NAME_LENGTH:
+                    raise ValueError("bad sensor name or location")
+                timestamp = now
+                if len(fields) > 2 and fields[2]:
+                    timestamp = float(fields[2])
+                    if not abs(timestamp - now) <= MAX_CLOCK_SKEW:
+                        raise ValueError("timestamp out of range")
+                sensor_type = fields[3] if len(fields) > 3 and fields[3] else "motion"
+                detected = len(fields) < 5 or fields[4] not in ("0", "false")
+            except ValueError:
+                invalid += 1
+                continue
+            if len(names) > 100000:
+                names.clear()
+            batch.append(SensorEvent(
+                names.setdefault(sensor_type, sensor_type),
+                names.setdefault(sensor_name, sensor_name),
+                names.setdefault(location, location),
+                timestamp,
+                detected,
+            ))
+        if invalid:
+            METRICS.inc("ingest_invalid", invalid)
+        if len(batch) >= self.batch_size:
+            self._hand_off()
+        return invalid
+
+    def _tick(self):
+        self._hand_off()
+        # Forget UDP sources whose buckets have been full for a while
+        if len(self.udp_buckets) > 10000:
+            cutoff = time.monotonic() - 60
+            self.udp_buckets = {addr: bucket for addr, bucket in self.udp_buckets.items() if bucket.updated > cutoff}
+        self.loop.call_later(self.flush_interval, self._tick)
+
+    def _hand_off(self):
+        batch = self._batch
+        if not batch:
+            return
+        self._batch = []
+        try:
+            self._deliveries.put_nowait(batch)
+        except queue.Full:
+            # The agent can't keep up; shed the batch rather than stall every connection
+            METRICS.inc("ingest_dropped", len(batch))
+            return
+        METRICS.inc("ingest_events", len(batch))
+
+    def _deliver_loop(self):
+        agent = self.system.agent
+        dispatcher = self.system.dispatcher
+        while True:
+            batch = self._deliveries.get()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            if dispatcher is not None:
+                for event in batch:
+                    dispatcher.submit(agent, event)
+            else:
+                for event in batch:
+                    agent.update(event)
+            METRICS.observe("ingest_batch", time.perf_counter() - started)
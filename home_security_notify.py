@@ -0,0 +1,405 @@
+"""Alert notifications (webhooks, email) delivered off the sensor thread.
+
+AlertSystem hands every alert to NotificationDispatcher.submit(), which only
+queues it. An outbox thread writes one notification_outbox row per channel
+and passes the rows to that channel's worker threads, which call the
+Notifier. A row is deleted once it is delivered. A failed delivery is
+retried with exponential backoff until max_attempts, after which the row is
+kept and marked dead. Rows still pending at shutdown or after a crash are
+sent on the next start, so delivery is at-least-once.
+
+Configure channels with add_notifier() or a "notifiers" config section:
+
+    "notifiers": [
+        {"type": "webhook", "url": "http://127.0.0.1:8080/alerts"},
+        {"type": "smtp", "host": "localhost", "sender": "guardian@home", "recipients": ["me@home"]}
+    ]
+"""
+import heapq
+import http.client
+import json
+import queue
+import random
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+import urllib.parse
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+
+from home_security import DB_PATH, METRICS
+
+
+class PermanentError(Exception):
+    """A delivery failure that retrying won't fix, e.g. the webhook answered 400"""
+
+
+class Notifier(ABC):
+    """One notification channel.
+
+    send() delivers an alert payload (a dict) and raises on failure. It is
+    called from up to concurrency worker threads at once.
+    """
+    def __init__(self, name, concurrency=1):
+        self.name = name
+        self.concurrency = concurrency
+
+    @abstractmethod
+    def send(self, payload):
+        pass
+
+    def close(self):
+        pass
+
+
+class WebhookNotifier(Notifier):
+    """POSTs the alert as JSON. Each worker thread keeps its HTTP connection open."""
+    def __init__(self, url, name="webhook", concurrency=2, timeout=5.0, headers=None):
+        super().__init__(name, concurrency)
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Webhook {name!r}: expected an http(s) URL, got {url!r}")
+        self.url = url
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = connection_class(self.host, self.port, timeout=self.timeout)
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def send(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        connection = self._connection()
+        while True:
+            reused = connection.sock is not None
+            try:
+                connection.request("POST", self.path, body, self.headers)
+                response = connection.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # The server may have closed an idle keep-alive connection; try a fresh one once
+                if not reused:
+                    raise
+        if response.will_close:
+            connection.close()
+        if 200 <= response.status < 300:
+            return
+        error = f"HTTP {response.status} {response.reason}"
+        if response.status == 429 or response.status >= 500:
+            raise RuntimeError(error)
+        raise PermanentError(error)
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+
+class SmtpNotifier(Notifier):
+    """Emails the alert. Each worker thread keeps its SMTP session open."""
+    def __init__(self, host, sender, recipients, port=25, name="email", concurrency=1, timeout=10.0,
+                 username=None, password=None, starttls=False):
+        super().__init__(name, concurrency)
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    session.starttls()
+                if self.username:
+                    session.login(self.username, self.password)
+            except Exception:
+                # Don't leave the half-open connection behind
+                session.close()
+                raise
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _drop_session(self):
+        session = self._local.session
+        self._local.session = None
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        try:
+            session.close()
+        except OSError:
+            pass
+
+    def build_message(self, payload):
+        message = EmailMessage()
+        message["Subject"] = f"[{payload.get('system', 'HomeSecurity')}] {payload['message']}"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(payload["timestamp"]))
+        lines = [payload["message"], "", f"Time: {when}"]
+        if payload.get("location"):
+            lines.append(f"Location: {payload['location']}")
+        if payload.get("sensor"):
+            lines.append(f"Sensor: {payload['sensor']}")
+        if payload.get("count", 1) > 1:
+            lines.append(f"Repeats: {payload['count']}")
+        message.set_content("\n".join(lines) + "\n")
+        return message
+
+    def send(self, payload):
+        message = self.build_message(payload)
+        while True:
+            reused = getattr(self._local, "session", None) is not None
+            session = self._session()
+            try:
+                session.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._drop_session()
+                # An idle session may have timed out on the server; reconnect once
+                if not reused:
+                    raise
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                code = getattr(e, "smtp_code", 550)
+                if code >= 500:
+                    raise PermanentError(f"SMTP {code}: {e}") from e
+                raise
+            except Exception:
+                self._drop_session()
+                raise
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            try:
+                session.quit()
+            except (smtplib.SMTPException, OSError):
+                session.close()
+
+
+NOTIFIER_TYPES = {"webhook": WebhookNotifier, "smtp": SmtpNotifier}
+
+
+def notifier_from_config(spec):
+    """Build a Notifier from a config dict such as {"type": "webhook", "url": "http://..."}"""
+    spec = dict(spec)
+    notifier_type = spec.pop("type", None)
+    if notifier_type not in NOTIFIER_TYPES:
+        raise ValueError(f"Notifier {spec.get('name')!r}: unknown type {notifier_type!r}")
+    return NOTIFIER_TYPES[notifier_type](**spec)
+
+
+class NotificationDispatcher:
+    """Queues alerts in the outbox table and delivers them through the notifiers.
+
+    submit() never blocks: if max_queue alerts are already waiting for the
+    outbox thread the alert is dropped and counted as notify_dropped. Each
+    channel gets concurrency worker threads of its own, so a slow or failing
+    channel never holds up the others. Retries wait base_delay * 2**n
+    seconds (with jitter, at most max_delay).
+    """
+    def __init__(self, db_path=DB_PATH, max_attempts=8, base_delay=1.0, max_delay=300.0, max_queue=10000):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.notifiers = {}
+        self.pending = 0
+        self._inbox = queue.Queue(max_queue)
+        self._jobs = {}
+        self._threads = []
+        self._outbox_thread = None
+        self._stopping = threading.Event()
+        self._send_metric = {}
+
+    def add_notifier(self, notifier):
+        if self._outbox_thread is not None:
+            raise RuntimeError("Add notifiers before starting the dispatcher")
+        if notifier.name in self.notifiers:
+            raise ValueError(f"Notifier {notifier.name!r} already exists")
+        self.notifiers[notifier.name] = notifier
+        self._send_metric[notifier.name] = "notify_send_" + re.sub(r"\W", "_", notifier.name)
+
+    def submit(self, payload):
+        """Queue an alert payload for every channel"""
+        if not self.notifiers:
+            return
+        try:
+            self._inbox.put_nowait(("alert", payload, time.time()))
+        except queue.Full:
+            METRICS.inc("notify_dropped")
+
+    def start(self):
+        if self._outbox_thread is not None or not self.notifiers:
+            return
+        self._stopping.clear()
+        self._jobs = {name: queue.Queue() for name in self.notifiers}
+        for name, notifier in self.notifiers.items():
+            for index in range(max(1, notifier.concurrency)):
+                thread = threading.Thread(
+                    target=self._worker_loop, args=(notifier, self._jobs[name]),
+                    name=f"Notifier-{name}-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        self._outbox_thread = threading.Thread(target=self._outbox_loop, name="NotificationOutbox", daemon=True)
+        self._outbox_thread.start()
+        METRICS.register_gauge("notify_pending", lambda: self.pending)
+        METRICS.register_gauge("notify_inbox_depth", self._inbox.qsize)
+        print(f"  - Notifications enabled: {', '.join(self.notifiers)}")
+
+    def stop(self, timeout=5.0):
+        """Stop delivering; whatever is undelivered stays in the outbox for the next start"""
+        if self._outbox_thread is None:
+            return
+        self._stopping.set()
+        for name, jobs in self._jobs.items():
+            for _ in range(max(1, self.notifiers[name].concurrency)):
+                jobs.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        # The outbox thread records the last results and queued alerts, then exits
+        self._inbox.put(None)
+        self._outbox_thread.join()
+        self._outbox_thread = None
+        for notifier in self.notifiers.values():
+            notifier.close()
+
+    def _worker_loop(self, notifier, jobs):
+        send_metric = self._send_metric[notifier.name]
+        while True:
+            job = jobs.get()
+            if job is None or self._stopping.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                notifier.send(job[2])
+            except PermanentError as e:
+                result = ("failed", job, str(e), True)
+            except Exception as e:
+                result = ("failed", job, f"{type(e).__name__}: {e}", False)
+            else:
+                result = ("delivered", job)
+                # Submit to delivery, retries included
+                METRICS.observe("notify_delivery", max(0.0, time.time() - job[3]))
+            METRICS.observe(send_metric, time.perf_counter() - started)
+            self._inbox.put(result)
+
+    def _outbox_loop(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # (due, row id, channel, payload, created, attempts)
+        retries = []
+        # Pick up what an earlier run left undelivered
+        for row_id, channel, payload, created, attempts, next_attempt in conn.execute(
+            "SELECT id, channel, payload, created, attempts, next_attempt FROM notification_outbox WHERE dead = 0"
+        ):
+            if channel in self._jobs:
+                retries.append((next_attempt, row_id, channel, json.loads(payload), created, attempts))
+        heapq.heapify(retries)
+        self.pending = len(retries)
+        if retries:
+            print(f"[NOTIFY] Resuming {len(retries)} undelivered notifications")
+        stopping = False
+        try:
+            while not stopping:
+                timeout = 1.0
+                if retries:
+                    timeout = min(timeout, max(0.0, retries[0][0] - time.time()))
+                items = []
+                try:
+                    items.append(self._inbox.get(timeout=timeout))
+                    while len(items) < 1000:
+                        items.append(self._inbox.get_nowait())
+                except queue.Empty:
+                    pass
+                ready = []
+                with conn:
+                    for item in items:
+                        if item is None:
+                            stopping = True
+                        elif item[0] == "alert":
+                            ready.extend(self._insert_alert(conn, item[1], item[2]))
+                        elif item[0] == "delivered":
+                            conn.execute("DELETE FROM notification_outbox WHERE id = ?", (item[1][0],))
+                            self.pending -= 1
+                            METRICS.inc("notify_sent")
+                        else:
+                            self._record_failure(conn, retries, *item[1:])
+                now = time.time()
+                while retries and retries[0][0] <= now:
+                    ready.append(retries[0][1:])
+                    heapq.heappop(retries)
+                if not stopping:
+                    for job in ready:
+                        self._jobs[job[1]].put(job)
+        finally:
+            conn.close()
+
+    def _insert_alert(self, conn, payload, created):
+        text = json.dumps(payload)
+        jobs = []
+        for channel in self._jobs:
+            cursor = conn.execute(
+                "INSERT INTO notification_outbox (channel, payload, created, next_attempt) VALUES (?, ?, ?, ?)",
+                (channel, text, created, created)
+            )
+            jobs.append((cursor.lastrowid, channel, payload, created, 0))
+        self.pending += len(jobs)
+        return jobs
+
+    def _record_failure(self, conn, retries, job, error, permanent):
+        row_id, channel, payload, created, attempts = job
+        attempts += 1
+        METRICS.inc("notify_failures")
+        if permanent or attempts >= self.max_attempts:
+            conn.execute(
+                "UPDATE notification_outbox SET attempts = ?, last_error = ?, dead = 1 WHERE id = ?",
+                (attempts, error, row_id)
+            )
+            self.pending -= 1
+            METRICS.inc("notify_dead")
+            print(f"[NOTIFY] Giving up on {channel} notification {row_id} after {attempts} attempts: {error}")
+            return
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        due = time.time() + delay
+        conn.execute(
+            "UPDATE notification_outbox SET attempts = ?, last_error = ?, next_attempt = ? WHERE id = ?",
+            (attempts, error, due, row_id)
+        )
+        heapq.heappush(retries, (due, row_id, channel, payload, created, attempts))
+        METRICS.inc("notify_retries")
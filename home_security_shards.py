@@ -0,0 +1,251 @@
+"""Multi-process sensor sharding for SecuritySystem.
+
+With SecuritySystem(shard_processes=N) the motion sensors are split into N
+groups and each group is polled by its own worker process. Workers write
+fixed-size detection records into a shared-memory ring buffer (one per
+worker, so no locks are needed) and a coordinator thread in the main
+process reads them in batches and hands them to the agent as SensorEvents.
+A worker that dies is restarted, up to max_restarts times per
+restart_window seconds.
+"""
+import heapq
+import multiprocessing
+import random
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from home_security import SensorEvent, METRICS
+
+# Ring header: the read position and stop flag (written by the coordinator)
+# and the write position and check count (written by the worker) on
+# separate cache lines. The stop flag lives here rather than in a
+# multiprocessing.Event, which can deadlock once a waiting worker is killed.
+_HEAD = 0
+_STOP = 8
+_TAIL = 64
+_CHECKS = 72
+_HEADER_SIZE = 128
+_U64 = struct.Struct("<Q")
+# One detection: epoch timestamp, sensor index, detected flag
+_RECORD = struct.Struct("<dIB3x")
+
+
+class ShmRing:
+    """Single-producer single-consumer ring of detection records in shared memory.
+
+    Positions only grow and a record lives in slot position % capacity. The
+    worker publishes a record by advancing the tail after writing it, and
+    the coordinator frees slots by advancing the head after reading them.
+    """
+    def __init__(self, capacity=65536, name=None):
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + capacity * _RECORD.size)
+            self.shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        # Each side caches its own position and only reads the other's when needed
+        self._head = _U64.unpack_from(self.buf, _HEAD)[0]
+        self._tail = _U64.unpack_from(self.buf, _TAIL)[0]
+        self._known_head = self._head
+
+    def push(self, timestamp, index, detected):
+        """Append a record (worker side); returns False if the ring is full"""
+        if self._tail - self._known_head >= self.capacity:
+            self._known_head = _U64.unpack_from(self.buf, _HEAD)[0]
+            if self._tail - self._known_head >= self.capacity:
+                return False
+        offset = _HEADER_SIZE + (self._tail % self.capacity) * _RECORD.size
+        _RECORD.pack_into(self.buf, offset, timestamp, index, detected)
+        self._tail += 1
+        _U64.pack_into(self.buf, _TAIL, self._tail)
+        return True
+
+    def pop_all(self, limit=4096):
+        """Return up to limit records (coordinator side) as (timestamp, index, detected)"""
+        tail = _U64.unpack_from(self.buf, _TAIL)[0]
+        count = min(tail - self._head, limit)
+        if count <= 0:
+            return []
+        start = self._head % self.capacity
+        first = min(count, self.capacity - start)
+        offset = _HEADER_SIZE + start * _RECORD.size
+        records = list(_RECORD.iter_unpack(self.buf[offset:offset + first * _RECORD.size]))
+        if count > first:
+            records += _RECORD.iter_unpack(self.buf[_HEADER_SIZE:_HEADER_SIZE + (count - first) * _RECORD.size])
+        self._head += count
+        _U64.pack_into(self.buf, _HEAD, self._head)
+        return records
+
+    def depth(self):
+        return _U64.unpack_from(self.buf, _TAIL)[0] - self._head
+
+    def request_stop(self):
+        self.buf[_STOP] = 1
+    
+    def stop_requested(self):
+        return self.buf[_STOP] != 0
+    
+    def set_checks(self, checks):
+        _U64.pack_into(self.buf, _CHECKS, checks)
+
+    def checks(self):
+        return _U64.unpack_from(self.buf, _CHECKS)[0]
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _worker_main(ring_name, capacity, sensors, interval, seed):
+    """Poll a group of (index, detection_probability) sensors and push detections"""
+    # Ctrl+C goes to the whole process group; shutdown is the coordinator's job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = ShmRing(capacity, ring_name)
+    rng = random.Random(seed)
+    low, high = interval
+    # Like a MotionSensor on the shared scheduler, the first check comes one
+    # random interval after start, which also spreads the sensors out
+    now = time.time()
+    heap = [(now + rng.uniform(low, high), index, probability) for index, probability in sensors]
+    heapq.heapify(heap)
+    checks = ring.checks()
+    try:
+        while heap and not ring.stop_requested():
+            due, index, probability = heap[0]
+            delay = due - time.time()
+            if delay > 0:
+                ring.set_checks(checks)
+                time.sleep(min(delay, 0.05))
+                continue
+            checks += 1
+            if rng.random() < probability:
+                # Wait for the coordinator rather than drop a detection
+                while not ring.push(time.time(), index, 1):
+                    if ring.stop_requested():
+                        return
+                    time.sleep(0.001)
+            heapq.heapreplace(heap, (due + rng.uniform(low, high), index, probability))
+    finally:
+        ring.set_checks(checks)
+        ring.close()
+
+
+class ShardCoordinator:
+    """Runs groups of MotionSensors in worker processes and delivers their detections.
+
+    Detections are delivered on the coordinator thread through each
+    sensor's notify_observers(), so the dispatcher and observers work as
+    they do for in-process sensors.
+    """
+    def __init__(self, sensors, processes, ring_capacity=65536, interval=(3, 10),
+                 max_restarts=5, restart_window=60.0, poll_interval=0.001, seed=None):
+        self.sensors = list(sensors)
+        self.processes = max(1, min(processes, len(self.sensors)))
+        self.groups = [
+            [(index, sensor.detection_probability)
+             for index, sensor in enumerate(self.sensors) if index % self.processes == shard]
+            for shard in range(self.processes)
+        ]
+        self.ring_capacity = ring_capacity
+        self.interval = interval
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.poll_interval = poll_interval
+        self.seed = seed
+        self.rings = []
+        self.workers = []
+        self.restarts = [[] for _ in self.groups]
+        self.delivered = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.sensors:
+            return
+        self._stopping.clear()
+        self.rings = [ShmRing(self.ring_capacity) for _ in self.groups]
+        self.workers = [self._spawn(shard) for shard in range(len(self.groups))]
+        METRICS.register_gauge("shard_ring_depth", lambda: sum(ring.depth() for ring in self.rings if ring.buf))
+        METRICS.register_gauge("shard_checks", lambda: sum(ring.checks() for ring in self.rings if ring.buf))
+        self._thread = threading.Thread(target=self._run, name="ShardCoordinator", daemon=True)
+        self._thread.start()
+        print(f"  - {len(self.sensors)} sensors sharded across {len(self.workers)} processes")
+
+    def _spawn(self, shard):
+        seed = None if self.seed is None else self.seed + shard
+        worker = self._context.Process(
+            target=_worker_main,
+            args=(self.rings[shard].name, self.ring_capacity, self.groups[shard], self.interval, seed),
+            name=f"SensorShard-{shard}",
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def stop(self, timeout=2.0):
+        """Stop the workers, deliver what they already sent and free the rings"""
+        if self._thread is None:
+            return
+        for ring in self.rings:
+            ring.request_stop()
+        for worker in self.workers:
+            if worker is not None:
+                worker.join(timeout)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        for ring in self.rings:
+            ring.close(unlink=True)
+
+    def _run(self):
+        last_check = time.monotonic()
+        while not self._stopping.is_set():
+            if not self._drain():
+                time.sleep(self.poll_interval)
+            if time.monotonic() - last_check >= 0.5:
+                last_check = time.monotonic()
+                self._check_workers()
+        # Workers have exited; pick up their last records
+        while self._drain():
+            pass
+
+    def _drain(self):
+        delivered = 0
+        sensors = self.sensors
+        for ring in self.rings:
+            for timestamp, index, detected in ring.pop_all():
+                sensor = sensors[index]
+                sensor.notify_observers(SensorEvent("motion", sensor.name, sensor.location, timestamp, bool(detected)))
+                delivered += 1
+        if delivered:
+            self.delivered += delivered
+            METRICS.inc("shard_events", delivered)
+        return delivered
+
+    def _check_workers(self):
+        for shard, worker in enumerate(self.workers):
+            if worker is None or worker.is_alive() or self.rings[shard].stop_requested():
+                continue
+            METRICS.inc("shard_crashes")
+            now = time.monotonic()
+            recent = [t for t in self.restarts[shard] if now - t < self.restart_window]
+            if len(recent) >= self.max_restarts:
+                print(f"[SHARDS] Worker {shard} exited with code {worker.exitcode}; "
+                      f"{len(recent)} restarts in {self.restart_window:g}s, giving up")
+                self.workers[shard] = None
+                continue
+            print(f"[SHARDS] Worker {shard} exited with code {worker.exitcode}; restarting")
+            self.restarts[shard] = recent + [now]
+            self.workers[shard] = self._spawn(shard)
@@ -0,0 +1,132 @@
+"""Load generator for the network ingest server (home_security_ingest).
+
+Opens many TCP connections (or one UDP socket) and sends sensor event lines
+at a target total rate, spread round-robin over the connections, from a
+single asyncio loop.
+
+    python home_security.py --headless --ingest-port 9555 --ingest-rate 1000
+    python ingest_client.py --connections 2000 --rate 20000 --duration 30
+"""
+import argparse
+import asyncio
+import random
+import socket
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def raise_open_file_limit(wanted):
+    """Raise the soft open-file limit toward wanted; returns the new limit"""
+    if resource is None:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        soft = target
+    return soft
+
+
+def make_line(sensor_index, locations):
+    return f"Remote Sensor {sensor_index}|{locations[sensor_index % len(locations)]}|{time.time():.3f}\n".encode()
+
+
+class _Sink(asyncio.Protocol):
+    def connection_lost(self, exc):
+        self.closed = True
+
+    closed = False
+
+
+async def run_tcp(host, port, connections, rate, duration, sensors, locations, tick=0.01):
+    loop = asyncio.get_running_loop()
+    transports = []
+    for _ in range(connections):
+        transport, protocol = await loop.create_connection(_Sink, host, port)
+        transport.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transports.append((transport, protocol))
+    print(f"Opened {len(transports)} connections to {host}:{port}")
+    sent = await _send(transports, rate, duration, sensors, locations, tick, _write_tcp)
+    for transport, _ in transports:
+        transport.close()
+    return sent
+
+
+def _write_tcp(target, data):
+    transport, protocol = target
+    if protocol.closed:
+        return False
+    transport.write(data)
+    return True
+
+
+async def run_udp(host, port, rate, duration, sensors, locations, tick=0.01):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+    sent = await _send([transport], rate, duration, sensors, locations, tick, _write_udp)
+    transport.close()
+    return sent
+
+
+def _write_udp(transport, data):
+    transport.sendto(data)
+    return True
+
+
+async def _send(targets, rate, duration, sensors, locations, tick, write):
+    """Every tick, write the lines due since the last one, round-robin over targets"""
+    rng = random.Random()
+    started = time.perf_counter()
+    deadline = started + duration
+    scheduled = sent = 0
+    next_target = 0
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        due = int((now - started) * rate) - scheduled
+        scheduled += due
+        # Group the lines for each target into one write
+        per_target = {}
+        for _ in range(due):
+            per_target.setdefault(next_target, []).append(make_line(rng.randrange(sensors), locations))
+            next_target = (next_target + 1) % len(targets)
+        for index, lines in per_target.items():
+            if write(targets[index], b"".join(lines)):
+                sent += len(lines)
+        await asyncio.sleep(tick)
+    return sent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send synthetic sensor events to an ingest server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9555)
+    parser.add_argument("--udp", action="store_true", help="send datagrams instead of TCP lines")
+    parser.add_argument("--connections", type=int, default=100, help="TCP connections to open")
+    parser.add_argument("--rate", type=float, default=1000.0, help="total events/sec")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to send for")
+    parser.add_argument("--sensors", type=int, default=1000, help="distinct sensor names")
+    parser.add_argument("--locations", type=int, default=20, help="distinct locations")
+    args = parser.parse_args(argv)
+
+    locations = [f"Zone {i}" for i in range(args.locations)]
+    if args.udp:
+        coroutine = run_udp(args.host, args.port, args.rate, args.duration, args.sensors, locations)
+    else:
+        limit = raise_open_file_limit(args.connections + 64)
+        if limit < args.connections + 64:
+            print(f"Open file limit is {limit}; some connections may fail")
+        coroutine = run_tcp(args.host, args.port, args.connections, args.rate, args.duration, args.sensors, locations)
+    started = time.perf_counter()
+    sent = asyncio.run(coroutine)
+    elapsed = time.perf_counter() - started
+    print(f"Sent {sent:,} events in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Replay recorded sensor traces through the sensor -> agent -> logger pipeline.
+
+Traces are CSV files with a header row or JSONL files with one object per
+line. Each record needs sensor_name, location and timestamp (epoch seconds
+or an ISO date/time); sensor_type defaults to "motion" and detected to
+true. Files are read one record at a time, so traces of any size can be
+replayed. Records are expected in time order.
+
+    python replay.py incident.jsonl --speed real --arm
+    python replay.py week.csv --speed max --db replay.db
+"""
+import argparse
+import csv
+import datetime
+import json
+import threading
+import time
+
+from home_security import SensorEvent, build_system, load_config, DEFAULT_CONFIG
+
+_TRUE = {"1", "true", "yes", "y", "t"}
+
+
+def _parse_timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def _parse_detected(value):
+    if value is None or value == "":
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE
+    return bool(value)
+
+
+def _to_event(record):
+    # A short CSV row leaves its missing columns as None
+    for field in ("sensor_name", "location", "timestamp"):
+        if record.get(field) in (None, ""):
+            raise ValueError(f"missing {field}")
+    return SensorEvent(
+        record.get("sensor_type") or "motion",
+        record["sensor_name"],
+        record["location"],
+        _parse_timestamp(record["timestamp"]),
+        _parse_detected(record.get("detected")),
+    )
+
+
+def read_trace(path, trace_format=None):
+    """Yield SensorEvents from a CSV or JSONL trace file, one line at a time"""
+    if trace_format is None:
+        trace_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+    with open(path, newline="", encoding="utf-8") as f:
+        if trace_format == "csv":
+            reader = csv.DictReader(f)
+            for record in reader:
+                try:
+                    event = _to_event(record)
+                except (ValueError, KeyError, TypeError) as e:
+                    raise ValueError(f"{path}:{reader.line_num}: bad trace record ({e!r})") from e
+                yield event
+        elif trace_format == "jsonl":
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    event = _to_event(json.loads(line))
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    raise ValueError(f"{path}:{line_number}: bad trace record ({e!r})") from e
+                yield event
+        else:
+            raise ValueError(f"Unknown trace format {trace_format!r}")
+
+
+class TraceReplayer:
+    """Feeds SensorEvents from a trace to a SecuritySystem's agent.
+
+    speed is the replay rate relative to the trace: 1.0 is real time, 10.0
+    ten times faster and None as fast as possible, in which case the logger
+    inserts rows in bulk. With rebase=True timestamps are shifted so the
+    trace starts now; otherwise events keep their recorded times. Debounce
+    and alert bursts are flushed on the trace clock.
+    """
+    # Trace seconds between debounce/alert-coalescing flushes
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, system, speed=None, rebase=False, bulk_size=5000):
+        self.system = system
+        self.speed = speed
+        self.rebase = rebase
+        self.bulk_size = bulk_size
+        self.replayed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop a replay in progress after the current event"""
+        self._stop.set()
+
+    def replay(self, events):
+        """Replay an iterable of SensorEvents; returns how many were replayed"""
+        agent = self.system.agent
+        logger = self.system.event_logger
+        paced = self.speed is not None
+        if not paced:
+            logger.begin_bulk(self.bulk_size)
+        trace_start = wall_start = shift = None
+        next_flush = None
+        try:
+            for event in events:
+                if self._stop.is_set():
+                    break
+                when = event.timestamp
+                if trace_start is None:
+                    trace_start = when
+                    wall_start = time.perf_counter()
+                    shift = time.time() - when if self.rebase else 0.0
+                    next_flush = when + self.FLUSH_INTERVAL
+                if paced:
+                    delay = wall_start + (when - trace_start) / self.speed - time.perf_counter()
+                    # Only wait when more than a millisecond ahead; finer sleeps overshoot
+                    if delay > 0.001 and self._stop.wait(delay):
+                        break
+                if shift:
+                    event = event._replace(timestamp=when + shift)
+                agent.update(event)
+                self.replayed += 1
+                if when >= next_flush:
+                    agent.flush_debounced(when + shift)
+                    self.system.alert_system.flush_coalesced(when + shift)
+                    next_flush = when + self.FLUSH_INTERVAL
+            agent.flush_debounced()
+            self.system.alert_system.flush_coalesced()
+        finally:
+            if not paced:
+                logger.end_bulk()
+            logger.flush()
+        return self.replayed
+
+
+def parse_speed(value):
+    """"max" -> None, "real" -> 1.0, otherwise a positive multiplier"""
+    if value == "max":
+        return None
+    if value == "real":
+        return 1.0
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError("speed must be positive")
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded sensor trace")
+    parser.add_argument("trace", help="CSV or JSONL trace file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="trace format (default: from the file extension)")
+    parser.add_argument("--speed", default="max", help='"real", "max" or a multiplier such as 10')
+    parser.add_argument("--rebase", action="store_true", help="shift timestamps so the trace starts now")
+    parser.add_argument("--config", help="JSON config file")
+    parser.add_argument("--db", help="database to write to (default: from the config)")
+    parser.add_argument("--arm", action="store_true", help="arm the system so detections raise alerts")
+    parser.add_argument("--write-behind", action="store_true", help="commit events in batches on a writer thread")
+    parser.add_argument("--debounce", type=float, default=0.0, help="fold repeat motion per sensor within this many seconds")
+    parser.add_argument("--alert-window", type=float, default=0.0, help="fold repeat alerts per location within this many seconds")
+    args = parser.parse_args(argv)
+    try:
+        speed = parse_speed(args.speed)
+    except ValueError:
+        parser.error(f"invalid --speed {args.speed!r}")
+
+    config = dict(load_config(args.config) if args.config else DEFAULT_CONFIG, sensors=[])
+    if args.db:
+        config["db_path"] = args.db
+    system = build_system(
+        config, write_behind=args.write_behind,
+        debounce_window=args.debounce, alert_coalesce_window=args.alert_window,
+    )
+    if args.arm:
+        system.arm_system()
+    replayer = TraceReplayer(system, speed=speed, rebase=args.rebase)
+    # Don't format and print a console line for every replayed event
+    logger = system.event_logger
+    echo = logger.echo
+    logger.echo = False
+    started = time.perf_counter()
+    error = None
+    try:
+        replayed = replayer.replay(read_trace(args.trace, args.format))
+    except KeyboardInterrupt:
+        replayed = replayer.replayed
+    except (ValueError, OSError) as e:
+        error = e
+    finally:
+        logger.echo = echo
+        # Stop the writer and dispatcher threads however the replay ended
+        system.stop()
+    elapsed = time.perf_counter() - started
+    if error is not None:
+        parser.error(f"{error} (after replaying {replayer.replayed:,} events)")
+    print(f"Replayed {replayed:,} events in {elapsed:.2f}s ({replayed / max(elapsed, 1e-9):,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Tests for EventLogger's recent-event cache and write-behind writer, and
+for the schema migrations in setup_database.
+
+Every answer RecentEventCache gives must match what SQLite returns for the
+same query; the recent_cache_hits/misses counters show which path answered.
+
+    python -m pytest -q
+"""
+import random
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import home_security
+from home_security import EventLogger, RetentionPolicy, METRICS, SCHEMA_MIGRATIONS, setup_database
+
+TYPES = ("MOTION", "ALERT", "SYSTEM")
+START = 1_700_000_000
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "events.db")
+    setup_database(path)
+    return path
+
+
+def make_logger(db_path, **options):
+    logger = EventLogger(db_path, **options)
+    logger.echo = False
+    return logger
+
+
+def log_random(logger, count, seed=1, start=START):
+    """Log count events, a fifth of them up to ten minutes late"""
+    rng = random.Random(seed)
+    for i in range(count):
+        late = rng.randrange(600) if rng.random() < 0.2 else 0
+        sensor = f"Sensor {rng.randrange(8)}"
+        logger.log_event(
+            rng.choice(TYPES),
+            f"event {i}" if rng.random() < 0.5 else None,
+            location=f"Zone {rng.randrange(4)}",
+            sensor=sensor,
+            when=start + i - late,
+        )
+
+
+def recent_from_database(logger, limit, event_type=None):
+    events, _ = logger.query_events(event_type=event_type, limit=limit)
+    return [(timestamp, name, description) for _, timestamp, name, _, description in events]
+
+
+def ids_since_from_database(db_path, last_id, limit):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT id FROM events WHERE id > ? ORDER BY id DESC LIMIT ?", (last_id, limit))
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+def cache_counters():
+    counters = METRICS.counters()
+    return counters.get("recent_cache_hits", 0), counters.get("recent_cache_misses", 0)
+
+
+def assert_matches_database(logger, db_path, limits=(1, 10, 50, 80)):
+    for limit in limits:
+        for event_type in (None,) + TYPES:
+            assert logger.get_recent_events(limit, event_type) == recent_from_database(logger, limit, event_type)
+    newest = ids_since_from_database(db_path, 0, 1)
+    for last_id in (0, 100, 250, 290, newest[0] if newest else 0):
+        since = logger.get_events_since(last_id, 20)
+        assert [event[0] for event in since] == ids_since_from_database(db_path, last_id, 20)
+
+
+def test_recent_events_match_database(db_path):
+    logger = make_logger(db_path, cache_size=50)
+    log_random(logger, 300)
+    assert_matches_database(logger, db_path)
+
+
+def test_reads_inside_the_cache_are_hits(db_path):
+    logger = make_logger(db_path, cache_size=50)
+    log_random(logger, 300)
+    hits, misses = cache_counters()
+    logger.get_recent_events(20)
+    logger.get_events_since(295, 20)
+    assert cache_counters() == (hits + 2, misses)
+    # More rows than the cache holds, and ids that were evicted
+    logger.get_recent_events(80)
+    logger.get_events_since(10, 20)
+    assert cache_counters() == (hits + 2, misses + 2)
+
+
+def test_cache_is_warmed_on_start(db_path):
+    log_random(make_logger(db_path), 300)
+    logger = make_logger(db_path, cache_size=50)
+    hits, misses = cache_counters()
+    assert logger.get_recent_events(20) == recent_from_database(logger, 20)
+    assert cache_counters() == (hits + 1, misses)
+    assert_matches_database(logger, db_path)
+
+
+def test_cache_follows_prune_by_rows(db_path):
+    logger = make_logger(db_path, cache_size=50)
+    log_random(logger, 300)
+    assert logger.prune(RetentionPolicy(max_rows=20)) == 280
+    assert_matches_database(logger, db_path)
+    hits, misses = cache_counters()
+    assert len(logger.get_recent_events(10)) == 10
+    assert cache_counters() == (hits + 1, misses)
+    # The cache can't tell that the rows it evicted were all pruned, so a
+    # read past what it holds still asks SQLite, and still gets all 20
+    assert len(logger.get_recent_events(80)) == 20
+
+
+def test_cache_follows_prune_by_age(db_path):
+    logger = make_logger(db_path, cache_size=50)
+    # One event a minute over the last five hours, so an hour's worth is kept
+    log_random(logger, 300, start=int(time.time()) - 300 * 60)
+    assert logger.prune(RetentionPolicy(max_age_days=1 / 24, batch_size=1000)) > 0
+    assert_matches_database(logger, db_path)
+
+
+def test_write_behind_flush(db_path):
+    logger = make_logger(db_path, write_behind=True, cache_size=50, batch_size=16)
+    try:
+        log_random(logger, 300)
+        assert logger.flush(timeout=10)
+        assert_matches_database(logger, db_path)
+    finally:
+        logger.close()
+
+
+def test_writer_survives_bad_rows_and_callbacks(db_path):
+    logger = make_logger(db_path, write_behind=True, cache_size=50)
+    try:
+        with pytest.raises(ValueError):
+            logger.log_event(None, "no type")
+        logger.log_event("MOTION", "before", location="Hall", sensor="A")
+        # A row that slipped past validation only loses itself, not its batch
+        logger._queue.put((time.time(), None, "bad", None, None, 1, None))
+        logger.log_event("MOTION", "after", location="Porch", sensor="B")
+
+        def broken_callback(rows):
+            raise RuntimeError("callback failed")
+        logger.set_commit_callback(broken_callback)
+        logger.log_event("ALERT", "with callback", location="Porch", sensor="B")
+        assert logger.flush(timeout=10)
+        logger.set_commit_callback(None)
+        logger.log_event("MOTION", "last", location="Hall", sensor="A")
+        assert logger.flush(timeout=10)
+        assert logger._writer_thread.is_alive()
+    finally:
+        logger.close()
+    descriptions = [description for _, _, description in recent_from_database(logger, 10)]
+    assert sorted(descriptions) == ["after", "before", "last", "with callback"]
+    assert_matches_database(logger, db_path, limits=(1, 4, 10))
+
+
+def test_bulk_mode_ends_while_logging(db_path):
+    logger = make_logger(db_path)
+    errors = []
+    done = threading.Event()
+
+    def log_until_done():
+        while not done.is_set():
+            try:
+                logger.log_event("MOTION", None, location="Hall", sensor="A")
+            except Exception as e:
+                errors.append(e)
+                return
+    thread = threading.Thread(target=log_until_done)
+    thread.start()
+    try:
+        for _ in range(2000):
+            logger.begin_bulk(50)
+            logger.end_bulk()
+    finally:
+        done.set()
+        thread.join()
+    assert errors == []
+    assert_matches_database(logger, db_path, limits=(1, 10))
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_search_index_survives_prune(db_path, write_behind):
+    # Events logged without a description are indexed by their standard
+    # text, the same text pruning deletes them with
+    logger = make_logger(db_path, write_behind=write_behind)
+    try:
+        log_random(logger, 300)
+        assert logger.flush(timeout=10)
+        assert logger.prune(RetentionPolicy(max_rows=100)) == 200
+    finally:
+        logger.close()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("INSERT INTO events_fts (events_fts, rank) VALUES ('integrity-check', 1)")
+    finally:
+        conn.close()
+    for text in ("Motion detected", "Alert triggered", "event"):
+        found, _ = logger.search_events(text, limit=300)
+        expected = [event for event in logger.query_events(limit=300)[0] if text in (event[4] or "")]
+        assert sorted(event[0] for event in found) == sorted(event[0] for event in expected)
+
+
+def make_old_database(path, version):
+    """A database at schema version with a few v1-style rows"""
+    conn = sqlite3.connect(path)
+    for migration in SCHEMA_MIGRATIONS[:version]:
+        migration(conn.cursor())
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def add_old_rows(path, count):
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO events (timestamp, event_type, description) VALUES (?, ?, ?)",
+        [("2024-01-01 12:00:00", "MOTION", f"Motion detected at Zone {i % 4} by Sensor {i % 8}") for i in range(count)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def interrupt(*args):
+    raise KeyboardInterrupt
+
+
+def test_interrupted_migration_can_be_retried(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    make_old_database(path, 1)
+    add_old_rows(path, 50)
+    make_old_database(path, 3)
+    # Stop the normalize migration after its tables exist and rows are being copied
+    monkeypatch.setattr(home_security, "_default_description", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        setup_database(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not tables & {"event_types", "sensors", "locations", "events_compact"}
+    conn.close()
+
+    monkeypatch.undo()
+    setup_database(path)
+    logger = make_logger(path)
+    events, _ = logger.query_events(limit=100)
+    assert len(events) == 50
+    assert events[0][4] == "Motion detected at Zone 1 by Sensor 1"
+
+
+def test_epoch_migration_after_columns_were_added(tmp_path):
+    # Versions before the transactional setup committed the new columns and
+    # could stop before the version bump
+    path = str(tmp_path / "old.db")
+    make_old_database(path, 1)
+    add_old_rows(path, 5)
+    conn = sqlite3.connect(path)
+    conn.execute("ALTER TABLE events ADD COLUMN ts INTEGER")
+    conn.execute("ALTER TABLE events ADD COLUMN sensor TEXT")
+    conn.commit()
+    conn.close()
+    setup_database(path)
+    events, _ = make_logger(path).query_events(limit=10)
+    assert sorted(location for _, _, _, location, _ in events) == ["Zone 0", "Zone 0", "Zone 1", "Zone 2", "Zone 3"]